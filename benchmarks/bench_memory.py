@@ -0,0 +1,89 @@
+"""
+Measures the memory used by linked parameters.
+
+Builds N services whose parameters are linked in chains (each service's parameters reference the
+previous service's), with the head of each chain linked to a configuration parameter, then
+resolves the configuration and the parameters. Peak and retained memory are measured with
+tracemalloc and reported per linked parameter.
+
+    python benchmarks/bench_memory.py [--services N] [--depth N]
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+from dataclasses import dataclass
+
+from vendorless.core import ServiceTemplate, parameter, parameters
+from vendorless.core.parameters import ParameterReference, configuration_parameter, resolve_parameters
+
+PARAMETERS = ['image', 'user', 'password', 'port']
+
+
+@dataclass
+class Service(ServiceTemplate):
+    image: str = parameter()
+    user: str = parameter()
+    password: str = parameter()
+    port: str = parameter()
+
+    def _template_list(self):
+        return []
+
+
+def build(services: int, depth: int) -> list:
+    objects = []
+    previous = None
+    for i in range(services):
+        service = Service()
+        for name in PARAMETERS:
+            if i % depth == 0:
+                value = configuration_parameter('chains', f'chain{i // depth}', name)
+                objects.append(value)
+            else:
+                value = getattr(previous, name)
+            setattr(service, name, value)
+        objects.append(service)
+        previous = service
+    return objects
+
+
+def resolve(objects: list):
+    for c in objects:
+        if isinstance(c, parameters.ConfigurationParameter):
+            c.value = f'{c.keys[1]}-{c.keys[2]}'
+    service_templates = [o for o in objects if isinstance(o, ServiceTemplate)]
+    resolve_parameters(service_templates)
+    for service in service_templates:
+        for name in PARAMETERS:
+            getattr(service, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--services', type=int, default=20000)
+    parser.add_argument('--depth', type=int, default=50)
+    args = parser.parse_args()
+
+    reference = ParameterReference(Service(), Service.__dict__['image'])
+    print(f"ParameterReference: {sys.getsizeof(reference)} bytes"
+          f"{f' + {sys.getsizeof(reference.__dict__)} bytes __dict__' if hasattr(reference, '__dict__') else ' (slotted)'}")
+    del reference
+
+    gc.collect()
+    tracemalloc.start()
+    objects = build(args.services, args.depth)
+    built, _ = tracemalloc.get_traced_memory()
+    resolve(objects)
+    resolved, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    links = args.services * len(PARAMETERS)
+    print(f"{args.services} services, {links} linked parameters, chains of {args.depth}")
+    print(f"    built:    {built / 2**20:8.1f} MiB ({built / links:6.0f} bytes per linked parameter)")
+    print(f"    resolved: {resolved / 2**20:8.1f} MiB ({resolved / links:6.0f} bytes per linked parameter)")
+    print(f"    peak:     {peak / 2**20:8.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
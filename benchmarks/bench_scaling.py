@@ -0,0 +1,218 @@
+"""
+Measures how rendering scales with the size of a blueprint.
+
+Synthetic blueprints have N services (each with a volume) whose images are linked in chains of
+a given depth, and a config file with the chains' settings plus unrelated filler settings. For
+each blueprint, the time and peak memory of Configuration.resolve and ServiceTemplate.render_stack
+(in-process, peak memory from tracemalloc) and of a full ``vl core render`` (in a subprocess,
+peak memory is its max RSS) are measured.
+
+    python benchmarks/bench_scaling.py [--sizes 10 100 1000 10000] [--depths 1 20] [--output results.json]
+    python benchmarks/bench_scaling.py --compare baseline.json  # exits 1 on a regression
+"""
+import argparse
+import gc
+import importlib.metadata
+import json
+import os
+import platform
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from vendorless.core import ServiceTemplate, parameters, yamlio
+from vendorless.core.parameters import Configuration
+from vendorless.core.utils import change_cwd
+
+BLUEPRINT = """
+from dataclasses import dataclass
+
+from vendorless.core import ServiceTemplate, Volume, computed_parameter, parameter
+from vendorless.core.parameters import configuration_parameter
+
+SERVICES = {services}
+DEPTH = {depth}
+
+
+@dataclass
+class Service(ServiceTemplate):
+    name: str = parameter()
+    image: str = parameter()
+    volume: str = parameter()
+
+    @computed_parameter
+    def service_name(self, name):
+        return f"service-{{name}}"
+
+    def _template_list(self):
+        return []
+
+    def _docker_compose(self):
+        return {{'services': {{self.service_name: {{'image': self.image, 'volumes': [f'{{self.volume}}:/data']}}}}}}
+
+
+# the objects have to stay referenced until the stack is rendered
+objects = []
+for i in range(SERVICES):
+    volume = Volume(name=f"data-{{i}}")
+    service = Service(name=str(i))
+    service.volume = volume.name
+    if i % DEPTH == 0:
+        image = configuration_parameter("chains", f"chain{{i // DEPTH}}", "image")
+        objects.append(image)
+    else:
+        image = objects[-1].image
+    service.image = image
+    objects += [volume, service]
+"""
+
+
+def write_blueprint(directory: Path, services: int, depth: int, settings: int) -> tuple[Path, Path]:
+    blueprint = directory / 'blueprint.py'
+    blueprint.write_text(BLUEPRINT.format(services=services, depth=depth))
+    chains = (services + depth - 1) // depth
+    config = {
+        'chains': {f'chain{i}': {'image': f'postgres:{i % 17}'} for i in range(chains)},
+        'filler': {f'group{i // 100}': {f'setting{i}': f'value-{i}'} for i in range(settings)},
+    }
+    config_path = directory / 'config.yaml'
+    with open(config_path, 'w') as f:
+        yamlio.dump(config, f)
+    return blueprint, config_path
+
+
+def measure(func, memory: bool) -> tuple[float, int | None]:
+    if memory:
+        tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return seconds, peak
+
+
+def in_process(blueprint: Path, config: Path, output: Path, repeat: int) -> dict[str, dict]:
+    """
+    Times (best of ``repeat``) and measures the peak memory of resolve and render_stack.
+    """
+    results = {'resolve': {'seconds': float('inf')}, 'render_stack': {'seconds': float('inf')}}
+    # the last run is traced for memory; tracemalloc slows it down too much to be timed
+    for run in range(repeat + 1):
+        memory = run == repeat
+        gc.collect()
+        blueprint_globals = runpy.run_path(str(blueprint))
+        output.mkdir(exist_ok=True)
+        with change_cwd(output):
+            configuration = Configuration(config, None)
+            for name, func in [('resolve', configuration.resolve), ('render_stack', ServiceTemplate.render_stack)]:
+                seconds, peak = measure(func, memory)
+                if memory:
+                    results[name]['peak_bytes'] = peak
+                else:
+                    results[name]['seconds'] = min(results[name]['seconds'], seconds)
+        del blueprint_globals
+    return results
+
+
+def full_render(blueprint: Path, config: Path, output: Path) -> dict:
+    """
+    Times a full ``vl core render`` and measures its max RSS.
+    """
+    command = [sys.executable, '-m', 'vendorless.core.cli', 'core', 'render', str(blueprint),
+               '-c', str(config), '-o', str(output), '-y']
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    _, status, rusage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    stderr = process.stderr.read().decode()
+    process.stderr.close()
+    if process.returncode != 0:
+        raise RuntimeError(f"vl core render failed:\n{stderr}")
+    maxrss = rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+    return {'seconds': seconds, 'peak_bytes': maxrss}
+
+
+def compare(results: list[dict], baseline_path: Path, threshold: float) -> list[str]:
+    with open(baseline_path) as f:
+        baseline = {
+            (r['benchmark'], r['services'], r['depth'], r['settings']): r
+            for r in json.load(f)['results']
+        }
+    regressions = []
+    for r in results:
+        before = baseline.get((r['benchmark'], r['services'], r['depth'], r['settings']))
+        if before is None:
+            continue
+        ratio = r['seconds'] / before['seconds']
+        if ratio > threshold:
+            regressions.append(
+                f"{r['benchmark']} (services={r['services']}, depth={r['depth']}, settings={r['settings']}): "
+                f"{before['seconds'] * 1000:.1f} ms -> {r['seconds'] * 1000:.1f} ms ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000], help='numbers of services')
+    parser.add_argument('--depths', type=int, nargs='+', default=[1, 20], help='lengths of the linked image chains')
+    parser.add_argument('--settings', type=int, default=10000, help='filler settings in the config file')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-cli', action='store_true', help="don't benchmark the full vl core render")
+    parser.add_argument('--output', type=Path, default=None, help='write the results to this JSON file')
+    parser.add_argument('--compare', type=Path, default=None, help='a previous --output to compare the times with')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown (ratio) reported as a regression')
+    args = parser.parse_args()
+
+    # resolve prints every setting
+    parameters.console.quiet = True
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for services in args.sizes:
+            for depth in args.depths:
+                directory = Path(tmp, f'{services}-{depth}')
+                directory.mkdir()
+                blueprint, config = write_blueprint(directory, services, depth, args.settings)
+                measurements = in_process(blueprint, config, directory / 'in-process', args.repeat)
+                if not args.no_cli:
+                    measurements['vl core render'] = full_render(blueprint, config, directory / 'cli')
+                for benchmark, stats in measurements.items():
+                    results.append({
+                        'benchmark': benchmark,
+                        'services': services,
+                        'depth': depth,
+                        'settings': args.settings,
+                        **stats,
+                    })
+                    print(f"{benchmark:<15} services={services:<6} depth={depth:<4} "
+                          f"{stats['seconds'] * 1000:10.1f} ms {stats['peak_bytes'] / 2**20:8.1f} MiB")
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'vendorless.core': importlib.metadata.version('vendorless.core'),
+                'results': results,
+            }, f, indent=2)
+
+    if args.compare is not None:
+        regressions = compare(results, args.compare, args.threshold)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Measures how ServiceTemplate.render_stack scales with ``workers`` (``vl core render -j``).
+
+Generates a package (``vendorless.benchworkers``) with Jinja templates that do a configurable
+amount of work, builds a stack of N service templates that render them, and times render_stack
+(writing to a temporary directory) for each number of workers.
+
+    python benchmarks/bench_workers.py [--services 200] [--files 4] [--loop 200] [--workers 1 2 4 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from vendorless.core.context import StackContext
+from vendorless.core.output import StackWriter
+
+TEMPLATE = """\
+{% for i in range(loop) %}
+line {{ i }}: {{ name }} {{ (name ~ i) | upper | replace('A', 'b') }} {{ i * i % 7 }}
+{% endfor %}
+"""
+
+SERVICE_TEMPLATES = """
+from dataclasses import dataclass
+
+from vendorless.core import ServiceTemplate, parameter
+
+
+@dataclass
+class Service(ServiceTemplate):
+    name: str = parameter()
+    loop: int = parameter()
+    template_dir = 'service'
+"""
+
+
+def write_package(directory: Path, files: int):
+    package = directory / 'vendorless' / 'benchworkers'
+    (package / 'templates' / 'service' / '{{ name }}').mkdir(parents=True)
+    (package / '__init__.py').write_text(SERVICE_TEMPLATES)
+    (package / 'templates' / '__init__.py').write_text('')
+    for i in range(files):
+        (package / 'templates' / 'service' / '{{ name }}' / f'file{i}.txt').write_text(TEMPLATE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--services', type=int, default=200)
+    parser.add_argument('--files', type=int, default=4, help='template files per service')
+    parser.add_argument('--loop', type=int, default=200, help='iterations of the loop in each template')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_package(Path(tmpdir), args.files)
+        sys.path.insert(0, tmpdir)
+        from vendorless.benchworkers import Service
+
+        print(f"{args.services} services x {args.files} files, {os.cpu_count()} CPUs, Python {sys.version.split()[0]}")
+        baseline = None
+        for workers in args.workers:
+            times = []
+            for _ in range(args.repeat):
+                with StackContext():
+                    services = [Service(name=f'service{i}', loop=args.loop) for i in range(args.services)]
+                    output = Path(tmpdir) / f'stack-{workers}'
+                    output.mkdir(exist_ok=True)
+                    start = time.perf_counter()
+                    Service.render_stack(workers=workers, writer=StackWriter(output))
+                    times.append(time.perf_counter() - start)
+                    del services
+            best = min(times)
+            baseline = baseline or best
+            print(f"    workers={workers:<3} {best:8.3f}s  speedup {baseline / best:5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
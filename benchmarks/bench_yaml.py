@@ -0,0 +1,76 @@
+"""
+Compares the libyaml-backed YAML I/O in vendorless.core.yamlio with pure-Python PyYAML on a
+large lock file and a large docker-compose file.
+
+    python benchmarks/bench_yaml.py [--services N] [--settings N] [--repeat N]
+"""
+import argparse
+import time
+
+import yaml
+
+from vendorless.core import yamlio
+
+
+def lock_file(n_settings: int) -> dict:
+    return {
+        'blueprint': 'vendorless.example.blueprints.large',
+        'configuration': {
+            f'tenant{i // 100}': {f'setting{i}': f'value-{i}'} for i in range(n_settings)
+        },
+        'packages': {'vendorless.core': '0.1.5'},
+        'files': {f'config/file-{i}.txt': f'{i:064x}' for i in range(n_settings // 10)},
+    }
+
+
+def compose_file(n_services: int) -> dict:
+    return {
+        'services': {
+            f'service-{i}': {
+                'image': 'postgres:17',
+                'environment': {'POSTGRES_USER': 'admin', 'POSTGRES_PASSWORD': f'secret-{i}'},
+                'volumes': [f'data-{i}:/var/lib/postgresql/data'],
+                'healthcheck': {'test': ['CMD', 'pg_isready'], 'interval': '10s', 'retries': 5},
+                'depends_on': [f'service-{i - 1}'] if i else [],
+            }
+            for i in range(n_services)
+        },
+        'volumes': {f'data-{i}': None for i in range(n_services)},
+    }
+
+
+def best_of(repeat: int, func) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--services', type=int, default=1000)
+    parser.add_argument('--settings', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"libyaml available: {yamlio.LIBYAML}")
+    for name, data in [('lock file', lock_file(args.settings)), ('compose file', compose_file(args.services))]:
+        text = yaml.safe_dump(data)
+        assert yamlio.dump(data) == text
+        results = {
+            'load (pure)': best_of(args.repeat, lambda: yaml.safe_load(text)),
+            'load (yamlio)': best_of(args.repeat, lambda: yamlio.load(text)),
+            'dump (pure)': best_of(args.repeat, lambda: yaml.safe_dump(data)),
+            'dump (yamlio)': best_of(args.repeat, lambda: yamlio.dump(data)),
+        }
+        print(f"{name} ({len(text) / 1e6:.1f} MB)")
+        for op, seconds in results.items():
+            print(f"    {op:<14} {seconds * 1000:9.1f} ms")
+        print(f"    speedup: load {results['load (pure)'] / results['load (yamlio)']:.1f}x, "
+              f"dump {results['dump (pure)'] / results['dump (yamlio)']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,49 @@
 set -x
 
 echo $@
+
+# Whether the bundle's manifest has the requested packages (the leading vendorless.* arguments,
+# optionally pinned with @<version> or ==<version>) and was built for this python3
+bundle_matches() {
+    python3 -I -S - "$@" <<'PYTHON'
+import json, re, sys
+
+def normalize(name):
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+with open(sys.argv[1]) as f:
+    manifest = json.load(f)
+python = '%d.%d' % sys.version_info[:2]
+if manifest.get('python') != python:
+    sys.exit(f"the bundle was built for Python {manifest.get('python')}, not {python}")
+distributions = {normalize(name): version for name, version in manifest.get('distributions', {}).items()}
+for arg in sys.argv[2:]:
+    if not arg.startswith('vendorless.'):
+        break
+    match = re.fullmatch(r'([\w.-]+)(?:(?:@|==)(.*))?', arg)
+    if match is None:
+        sys.exit(f"can't check {arg} against the bundle")
+    # versions are compared exactly; ranges (e.g. @^1.0) are installed instead
+    name, version = match.groups()
+    if normalize(name) not in distributions:
+        sys.exit(f"the bundle doesn't include {name}")
+    if version is not None and version != distributions[normalize(name)]:
+        sys.exit(f"the bundle has {name} {distributions[normalize(name)]}, not {version}")
+PYTHON
+}
+
+BUNDLE="${VENDORLESS_BUNDLE:-/bundle}"
 if [ -z "$(ls -A /package)" ]; then
     # packages is empty
 
+    # use the prebuilt bundle (vl core package bundle) if it matches
+    if [ -f "$BUNDLE/manifest.json" ] && bundle_matches "$BUNDLE/manifest.json" "$@"; then
+        while [ "${1#vendorless.}" != "$1" ]; do
+            shift
+        done
+        PYTHONPATH="$BUNDLE/site" PYTHONNOUSERSITE=1 exec python3 -m vendorless.core.cli "$@"
+    fi
+
     # set up dummy poetry project for the environment
     mkdir -p /package
     cd /package
@@ -1,9 +1,32 @@
-from .parameters import (
-    parameter,
-    computed_parameter,
-    ConfigurationParameter
-)
-from .service_template import (
-    ServiceTemplate,
-)
-from .volume import Volume
\ No newline at end of file
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .parameters import (
+        parameter,
+        computed_parameter,
+        ConfigurationParameter
+    )
+    from .service_template import (
+        ServiceTemplate,
+    )
+    from .volume import Volume
+
+# imported on first use, so commands that don't render (e.g. `vl core render --check`) don't import Jinja
+_EXPORTS = {
+    'parameter': 'parameters',
+    'computed_parameter': 'parameters',
+    'ConfigurationParameter': 'parameters',
+    'ServiceTemplate': 'service_template',
+    'Volume': 'volume',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,143 @@
+"""
+Caches evaluated blueprints so re-rendering a stack can skip running its blueprint.
+
+The cache holds the blueprint's service templates and configuration parameters before the
+configuration is resolved. It's keyed by the hash of the blueprint's source, the hashes of the
+vendorless modules that were imported, and the versions of the vendorless packages.
+
+Caches are pickles, and loading a pickle can run arbitrary code, so they're kept in the user's
+cache directory (see :func:`cache_dir`) rather than in a stack's output directory, which may
+be shared or come from elsewhere, and a cache file that another user could have written isn't
+loaded.
+"""
+import hashlib
+import importlib.metadata
+import os
+import pickle
+import sys
+import warnings
+from dataclasses import dataclass
+from pathlib import Path
+
+from .parameters import ConfigurationParameter
+from .context import current_context
+from .fingerprints import blueprint_source
+from .service_template import ServiceTemplate
+from .utils import cache_dir
+
+FORMAT_VERSION = 1
+
+
+@dataclass
+class EvaluatedBlueprint:
+    service_templates: list[ServiceTemplate]
+    configuration_parameters: list[ConfigurationParameter]
+
+
+def _hash_file(path: str | Path) -> str | None:
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def cache_path(source: Path | None) -> Path | None:
+    """
+    The cache file of the blueprint at ``source``, or None if its source file isn't known.
+    """
+    if source is None:
+        return None
+    key = hashlib.sha256(str(Path(source).resolve()).encode()).hexdigest()
+    return cache_dir() / 'blueprints' / f'{key}.pickle'
+
+
+def _vendorless_modules() -> dict[str, str]:
+    modules = {}
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, '__file__', None)
+        if name.startswith('vendorless.') and path:
+            modules[path] = _hash_file(path)
+    return modules
+
+
+def _header(source: Path, packages: dict[str, str], modules: dict[str, str]) -> dict:
+    return {
+        'format': FORMAT_VERSION,
+        'python': sys.version,
+        'blueprint': _hash_file(source),
+        'modules': modules,
+        'packages': packages,
+    }
+
+
+def capture(source: Path | None, packages: dict[str, str]) -> bytes | None:
+    """
+    Serializes the current stack context's (unresolved) service templates and configuration parameters.
+
+    Returns None, with a warning, if the blueprint can't be cached (e.g. it defines its own classes).
+    """
+    if source is None:
+        warnings.warn("The blueprint's source file can't be found, so it can't be cached.")
+        return None
+    context = current_context()
+    evaluated = EvaluatedBlueprint(
+        service_templates=list(context.service_templates.values()),
+        configuration_parameters=list(context.configuration_parameters.values()),
+    )
+    try:
+        graph = pickle.dumps(evaluated, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError, RecursionError) as e:
+        warnings.warn(f"The blueprint can't be cached: {e}")
+        return None
+    header = _header(source, packages, _vendorless_modules())
+    return pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL) + graph
+
+
+def save(path: Path, data: bytes):
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+        f.write(data)
+    tmp.replace(path)
+
+
+def _is_trusted(path: Path) -> bool:
+    # only this user can have written it
+    st = path.stat()
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        return False
+    return not st.st_mode & 0o022
+
+
+def load(path: Path, source: Path | None) -> EvaluatedBlueprint | None:
+    """
+    Loads a cached blueprint evaluation into the current stack context, or returns None if it's missing or stale.
+    """
+    if source is None or path is None or not path.is_file():
+        return None
+    try:
+        if not _is_trusted(path):
+            return None
+        with open(path, 'rb') as f:
+            header = pickle.load(f)
+            if header.get('format') != FORMAT_VERSION or header.get('python') != sys.version:
+                return None
+            if header['blueprint'] != _hash_file(source):
+                return None
+            for package, version in header['packages'].items():
+                if importlib.metadata.version(package) != version:
+                    return None
+            for module_path, digest in header['modules'].items():
+                if _hash_file(module_path) != digest:
+                    return None
+            evaluated: EvaluatedBlueprint = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, importlib.metadata.PackageNotFoundError,
+            ImportError, AttributeError, KeyError, TypeError):
+        return None
+
+    for service_template in evaluated.service_templates:
+        service_template._register()
+    for configuration_parameter in evaluated.configuration_parameters:
+        configuration_parameter._register()
+    return evaluated
@@ -0,0 +1,77 @@
+"""
+Bundles of vendorless packages and their dependencies (``vl package bundle``).
+
+A bundle is a directory with the packages installed in ``site/`` (with ``pip install --target``,
+so the modules are byte-compiled) and a ``manifest.json`` describing it. It's used by putting
+``site/`` on ``PYTHONPATH``::
+
+    PYTHONPATH=bundle/site python -m vendorless.core.cli core render ...
+
+The Docker entrypoint runs ``vl`` from the bundle in ``/bundle`` when it includes the requested
+packages, instead of installing them when the container starts.
+"""
+import importlib.metadata
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from .process import run
+
+MANIFEST = 'manifest.json'
+SITE = 'site'
+
+
+def build(packages: list[str], output: Path, python: str = sys.executable, pip_args: tuple[str, ...] = ()) -> dict:
+    """
+    Installs ``packages`` (pip requirement specifiers) into a new bundle at ``output``, replacing
+    any bundle that's there, and returns its manifest.
+
+    The bundle is built next to ``output`` and moved into place when it's complete, so a failed
+    build leaves the previous bundle intact.
+
+    Raises
+    ------
+    RuntimeError
+        If pip fails.
+    """
+    output = Path(output).resolve()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix=f'.{output.name}.', dir=output.parent) as tmpdir:
+        staging = Path(tmpdir) / 'bundle'
+        command = (python, '-m', 'pip', 'install', '--target', str(staging / SITE), '--disable-pip-version-check', *pip_args, *packages)
+        result = run(*command, echo=True)
+        if not result.ok:
+            raise RuntimeError(f"'{' '.join(command)}' failed with exit code {result.returncode}")
+
+        version = run(python, '-c', 'import sys; print("%d.%d" % sys.version_info[:2])', capture=True)
+        manifest = {
+            'packages': list(packages),
+            'python': version.stdout.strip(),
+            'distributions': {
+                d.metadata['Name']: d.version
+                for d in sorted(importlib.metadata.distributions(path=[str(staging / SITE)]), key=lambda d: d.metadata['Name'].lower())
+            },
+        }
+        with open(staging / MANIFEST, 'w') as f:
+            json.dump(manifest, f, indent=2)
+            f.write('\n')
+
+        # swap the bundles; the old one is cleaned up with the temporary directory
+        if output.exists():
+            os.replace(output, Path(tmpdir) / 'previous')
+        os.replace(staging, output)
+    return manifest
+
+
+def read_manifest(bundle: Path) -> dict | None:
+    """
+    The manifest of the bundle at ``bundle``, or None if there isn't one.
+    """
+    try:
+        with open(Path(bundle) / MANIFEST) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
@@ -1,32 +1,13 @@
-import importlib
-import pkgutil
 import click
 
+from vendorless.core.plugins import LazyGroup, plugin_index
 
-import pkgutil
-import sys
-import vendorless
 
-package_cli = {}
-for module_info in pkgutil.iter_modules(vendorless.__path__):
-    try:
-        mod = __import__(f'vendorless.{module_info.name}.commands', fromlist=['cli'])
-        cli = getattr(mod, 'cli', None)
-        if cli is not None:
-            package_cli[module_info.name] = cli
-    except ImportError:
-        pass
-
-
-@click.group()
+# Package subcommands are looked up in a cached index and only imported when invoked
+@click.group(cls=LazyGroup, plugins=plugin_index())
 def main():
     """Dispatcher CLI."""
 
 
-# Dynamically add subcommands to the main group
-for name, cmd in package_cli.items():
-    main.add_command(cmd, name=name)
-
-
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(prog_name="vl")
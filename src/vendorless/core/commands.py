@@ -1,31 +1,43 @@
 import click
 import importlib.resources
-from cookiecutter.main import cookiecutter
 import tempfile
 
 from pathlib import Path
 
 import runpy
-import subprocess
 from rich.console import Console
 import rich.prompt
 from rich.table import Table
 import rich.progress
-import shutil
 
 import re
 import os
 import sys
+import asyncio
+import contextlib
+import io
+import signal
+import time
+import glob
+import warnings
+from dataclasses import dataclass
+from typing import Awaitable, Callable, TypeVar
 import importlib.metadata
-import yaml
+import json
+from . import yamlio
 import re
 
-from vendorless.core.parameters import ConfigurationParameter, Configuration
-from vendorless.core.service_template import ServiceTemplate
-from .utils import change_cwd
+from vendorless.core.context import StackContext, with_stack_context
+from vendorless.core.parameters import Configuration
+from vendorless.core.output import StackWriter, TarWriter, hash_file
+from vendorless.core import daemon, fingerprints, profiling
+from vendorless.core.process import ProcessResult, run, run_process
+from .utils import change_cwd, cache_dir
 
 console = Console()
 
+T = TypeVar('T')
+
 @click.group()
 def cli():
     pass
@@ -36,48 +48,196 @@ def confirm(prompt: str, yes: bool):
 
 @cli.command()
 @click.argument('blueprint', type=click.STRING)
-@click.option('-c', '--config', type=click.Path(exists=True, file_okay=True, dir_okay=False, path_type=Path), default=None, help='path to YAML file with config')
-@click.option('-cs', '--config-select', type=str, default=None, help='used to select the config from a key path in the YAML file')
+@click.option('-c', '--config', type=click.Path(exists=True, file_okay=True, dir_okay=False, path_type=Path), multiple=True, help='path to YAML file with config (can be repeated; later files override earlier ones)')
+@click.option('-cs', '--config-select', type=str, default=None, help='used to select the config from a dotted key path in the YAML files')
 @click.option('-o', '--output', type=click.Path(file_okay=False, dir_okay=True, path_type=Path), default=None, help='path to the output directory')
 @click.option('-y', '--yes', is_flag=True, help='Answer yes to all prompts')
-def render(blueprint: str, config: Path | None, config_select: str | None, output: Path | None, yes: bool):
+@click.option('--template-cache', is_flag=True, help='cache compiled templates on disk between runs')
+@click.option('-j', '--workers', type=click.IntRange(min=1), default=1, help='number of processes to render service templates in')
+@click.option('--cache-blueprint', is_flag=True, help="cache the evaluated blueprint (in the user's cache directory) and reuse it if the blueprint and packages haven't changed")
+@click.option('--profile', is_flag=True, help='print the time spent in each render phase, service template, and template file')
+@click.option('--profile-trace', type=click.Path(dir_okay=False, path_type=Path), default=None, help='write the profile as a Chrome trace (chrome://tracing, Perfetto) to this path')
+@click.option('--daemon', 'use_daemon', is_flag=True, help='render with the render daemon (vl core serve) instead of in this process; requires --yes')
+@click.option('--archive', type=click.Path(dir_okay=False, allow_dash=True), default=None, help="write the stack to a tar archive at this path ('-' for stdout) instead of a directory")
+@click.option('--compression', type=click.Choice(['none', 'gz', 'bz2', 'xz']), default=None, help="compression of the --archive (by default from its extension, e.g. .tar.gz)")
+@click.option('--check', is_flag=True, help="don't render; exit with 0 if the stack is up to date (according to its lock file) or 1 if it's stale")
+@click.pass_context
+def render(ctx: click.Context, blueprint: str, config: tuple[Path, ...], config_select: str | None, output: Path | None, yes: bool, template_cache: bool, workers: int, cache_blueprint: bool, profile: bool, profile_trace: Path | None, use_daemon: bool, archive: str | None, compression: str | None, check: bool):
     """
     Renders a blueprint to a stack.
 
     STACK is the module (.py file or package module) that defines the stack.
     """
-    # Run the blueprint; Keep the objects in results alive - used for resolve and render
+    if check:
+        reason = check_stack(blueprint, config, config_select, output or default_output_dir(blueprint))
+        if reason is None:
+            click.echo("up to date")
+            ctx.exit(0)
+        click.echo(f"stale: {reason}")
+        ctx.exit(1)
+
+    if use_daemon:
+        if not yes:
+            raise click.UsageError("--daemon requires --yes (the daemon can't prompt)")
+        if archive is not None:
+            raise click.UsageError("--daemon can't be used with --archive")
+        if profile or profile_trace:
+            raise click.UsageError("--daemon can't be used with --profile (the render runs in the daemon)")
+        request = {
+            'command': 'render',
+            'cwd': os.getcwd(),
+            'blueprint': blueprint,
+            'config': [str(path) for path in config],
+            'config_select': config_select,
+            'output': None if output is None else str(output),
+            'template_cache': template_cache,
+            'workers': workers,
+            'cache_blueprint': cache_blueprint,
+            'environ': {k: v for k, v in os.environ.items() if k.startswith(Configuration.ENV_PREFIX)},
+        }
+        try:
+            response = daemon.request(request)
+        except daemon.DaemonNotRunning:
+            raise click.ClickException("the render daemon isn't running (start it with 'vl core serve')")
+        console.print(response.get('output', ''), end='', markup=False, highlight=False)
+        sys.stderr.write(''.join(response.get('warnings', [])))
+        if not response['ok']:
+            raise click.ClickException(response['error'])
+        return
+
+    with open_archive(archive, compression) if archive is not None else contextlib.nullcontext() as archive_writer:
+        if not (profile or profile_trace):
+            render_blueprint(blueprint, config, config_select, output, yes, template_cache, workers, cache_blueprint, archive=archive_writer)
+            return
+
+        if profile_trace is not None:
+            profile_trace = profile_trace.resolve()
+        profiling.enable()
+        try:
+            render_blueprint(blueprint, config, config_select, output, yes, template_cache, workers, cache_blueprint, archive=archive_writer)
+        finally:
+            profiler = profiling.disable()
+            profiler.summary(console)
+            if profile_trace is not None:
+                profiler.write_chrome_trace(profile_trace)
+                console.print(f"Wrote trace to [bold]{profile_trace}[/bold]")
+
+
+@contextlib.contextmanager
+def open_archive(archive: str, compression: str | None):
+    """
+    Opens a :class:`TarWriter` for ``vl core render --archive``.
+
+    When the archive is streamed to stdout, console output goes to stderr instead. If the render
+    fails, the archive isn't finalised, and an archive file is deleted.
+    """
+    if compression is None:
+        suffix = archive.rsplit('.', 1)[-1] if archive != '-' else ''
+        compression = {'gz': 'gz', 'tgz': 'gz', 'bz2': 'bz2', 'xz': 'xz'}.get(suffix, 'none')
+    if compression == 'none':
+        compression = ''
+
+    if archive == '-':
+        stdout = sys.stdout.buffer
+        with contextlib.redirect_stdout(sys.stderr), TarWriter(stdout, compression) as writer:
+            yield writer
+        stdout.flush()
+    else:
+        try:
+            with open(archive, 'wb') as f, TarWriter(f, compression) as writer:
+                yield writer
+        except BaseException:
+            Path(archive).unlink(missing_ok=True)
+            raise
+
+
+def default_output_dir(blueprint: str) -> Path:
+    if blueprint.endswith('.py'):
+        return Path(Path(blueprint).stem)
+    return Path(blueprint)
+
+
+def check_stack(blueprint: str, config: tuple[Path, ...], config_select: str | None, output: Path) -> str | None:
+    """
+    Checks whether rendering would change a stack, without running the blueprint.
+
+    Returns None if the stack is up to date, or the reason it's stale.
+    """
+    lock_path = output / 'vendorless-lock.yaml'
+    if not lock_path.is_file():
+        return "there's no lock file"
+    with open(lock_path) as f:
+        lock = yamlio.load(f) or {}
+    return fingerprints.check(lock, blueprint, [path.resolve() for path in config], config_select, dict(os.environ), lock_path)
+
+
+@with_stack_context
+def render_blueprint(blueprint: str, config: tuple[Path, ...], config_select: str | None, output: Path | None, yes: bool, template_cache: bool, workers: int, cache_blueprint: bool, interactive: bool = True, environ: dict[str, str] | None = None, archive: TarWriter | None = None) -> StackWriter | TarWriter | None:
+    """
+    Renders a blueprint to a stack (see ``vl core render``).
+
+    Returns the stack's writer (which lists the files that were written, unchanged, and removed),
+    or None if the render was cancelled at a prompt. If ``interactive`` is False, settings that
+    aren't configured aren't prompted for (see :meth:`Configuration.resolve`); pass ``yes`` too.
+    ``environ`` is used for ``VENDORLESS_CONFIG__*`` settings instead of ``os.environ``. If
+    ``archive`` is given, the stack is written to it instead of the output directory. Each render
+    has its own :class:`StackContext`.
+    """
+    # imported here so `vl core render --check` doesn't import Jinja
+    from vendorless.core import blueprint_cache
+    from vendorless.core.service_template import ServiceTemplate
+    from vendorless.core.templating import enable_bytecode_cache
+
+    if template_cache:
+        enable_bytecode_cache(cache_dir() / 'templates')
+
+    if output is None:
+        output = default_output_dir(blueprint)
+
+    # Run the blueprint (or load its cached evaluation); Keep the objects in results alive - used for resolve and render
+    source = fingerprints.blueprint_source(blueprint)
+    blueprint_cache_path = blueprint_cache.cache_path(source)
+    with profiling.span('load blueprint', 'phase'):
+        results = blueprint_cache.load(blueprint_cache_path, source) if cache_blueprint else None
+        if results is not None:
+            console.print(f"Loading blueprint ([bold]{blueprint}[/bold]) from cache")
+        else:
+            console.print(f"Loading blueprint ([bold]{blueprint}[/bold])")
+            if blueprint.endswith('.py'):
+                results = runpy.run_path(blueprint)
+            else:
+                results = runpy.run_module(blueprint)
 
-    console.print(f"Loading blueprint ([bold]{blueprint}[/bold])")
     if blueprint.endswith('.py'):
-        blueprint_path = Path(blueprint)
-        results = runpy.run_path(blueprint)
-        default_output_dir_name = blueprint_path.stem
         blueprint = str(Path(blueprint).resolve())
-    else:
-        results = runpy.run_module(blueprint)
-        default_output_dir_name = blueprint
     
     packages = [f"{p}" for p in set(sys.modules.keys()) if p.startswith('vendorless.') and len(p.split('.'))==2]
     packages = {p: importlib.metadata.version(p) for p in packages}
+
+    # the evaluated blueprint is captured before the configuration is resolved
+    evaluated_blueprint = None
+    if cache_blueprint and isinstance(results, dict):
+        with profiling.span('capture blueprint', 'phase'):
+            evaluated_blueprint = blueprint_cache.capture(source, packages)
     
-    if output is None:
-        output = Path(default_output_dir_name)
-    
-    if output.exists():
+    previous_lock: dict = {}
+    if archive is None and output.exists():
         if not confirm("The stack already exists. Do you want to overwrite it?", yes):
             return
 
         existing_lock_file = output / 'vendorless-lock.yaml'
-        if (config is None) and existing_lock_file.exists():
+        if existing_lock_file.exists():
+            with open(existing_lock_file, 'r') as f:
+                previous_lock = yamlio.load(f) or {}
+
+        if (not config) and existing_lock_file.exists():
             if confirm(f"Do you want to load the stack's config?", yes):
-                config = existing_lock_file
-                config_select = 'Config'
+                config = (existing_lock_file,)
+                config_select = 'configuration'
 
             console.print("Checking package versions from lock file")
-            with open(existing_lock_file, 'r') as f:
-                previous_packages: dict = yaml.safe_load(f)['packages']
-            
+            previous_packages: dict = previous_lock['packages']
+        
             packages_diff = []
             for p in set(packages) | set(previous_packages):
                 if packages.get(p) == previous_packages.get(p):
@@ -87,9 +247,9 @@ def render(blueprint: str, config: Path | None, config_select: str | None, outpu
                     f"+{packages[p]}" if p in packages else "",
                     f"-{previous_packages[p]}" if p in previous_packages else "",
                 ])
-            
+        
             packages_diff.sort(key=lambda x: x[0])
-            
+        
             if packages_diff:
                 table = Table(title="Package Differences")
                 table.add_column("Package", justify="left", no_wrap=True)
@@ -100,156 +260,532 @@ def render(blueprint: str, config: Path | None, config_select: str | None, outpu
                 console.print(table)
                 if not confirm("Package versions have changed. Do you want to continue?", yes):
                     return
-    else:
+    elif archive is None:
         console.print(f"Creating output directory [bold]{str(output)}[/bold]")
         output.mkdir(parents=True, exist_ok=True)
     
-    if config is not None:
-        config = config.resolve()
+    config = [path.resolve() for path in config]
+
+    if evaluated_blueprint is not None:
+        blueprint_cache.save(blueprint_cache_path, evaluated_blueprint)
 
-    with change_cwd(output):
+    with change_cwd(output) if archive is None else contextlib.nullcontext():
         # Load settings
-        configuration = Configuration(config, config_select) 
-        configuration.resolve()
+        with profiling.span('resolve configuration', 'phase'):
+            configuration = Configuration(config, config_select, environ)
+            configuration.resolve(interactive=interactive)
 
-        # Render the stack
-        files_before = {str(file) for file in Path('.').iterdir() if file.is_file()}
+        # Render the stack; unchanged files aren't rewritten
         console.print("Rendering the stack")
-        ServiceTemplate.render_stack()
+        writer = archive if archive is not None else StackWriter(Path('.'), previous_lock.get('files'))
+        ServiceTemplate.render_stack(workers=workers, writer=writer)
 
         # Save a lock file
         console.print("Saving the lock file")
         lock_file = {
             'blueprint': blueprint,
             'configuration': configuration.dict(),
+            'configuration_sources': configuration.sources(),
             'packages': packages,
+            'fingerprints': fingerprints.fingerprints(source, configuration.dict(), list(packages)),
+            'files': writer.hashes,
         }
-        with open('vendorless-lock.yaml', 'w') as f:
-            yaml.safe_dump(lock_file, f)
+        with profiling.span('write lock file', 'phase'):
+            writer.write('vendorless-lock.yaml', yamlio.dump(lock_file), record=False)
 
         # clean if necessary
-        files_after = {str(file) for file in Path('.').iterdir() if file.is_file()}
-        leftover_files = files_before - files_after
+        leftover_files = writer.leftovers()
         if leftover_files:
             console.print("The following files are leftovers from previous work:")
             for leftover in sorted(leftover_files):
                 console.print(f" [red]-{leftover}[/red]")
             if confirm("Do you want to clean up these leftover files?", yes):
-                for leftover in rich.progress.track(leftover_files, description="Cleaning up..."):
-                    file_path = Path(leftover)
-                    if file_path.is_file():  # Double check it's a file
-                        file_path.unlink()
+                with profiling.span('clean up', 'phase'):
+                    writer.remove(rich.progress.track(leftover_files, description="Cleaning up..."))
+
+        console.print(f"Stack files: {writer.summary()}")
+        return writer
+
+
+def serve_request(request: dict) -> dict:
+    """
+    Handles a render daemon request (see :mod:`vendorless.core.daemon`).
+    """
+    command = request.get('command')
+    if command == 'ping':
+        return {'ok': True, 'pid': os.getpid()}
+    if command != 'render':
+        return {'ok': False, 'error': f"unknown command '{command}'"}
+
+    start = time.perf_counter()
+    # the consoles write to sys.stdout, so this captures their output too; warnings are returned
+    # to the client rather than printed to the daemon's stderr
+    buffer = io.StringIO()
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        response = _serve_render(request, buffer)
+    response['warnings'] = [warnings.formatwarning(w.message, w.category, w.filename, w.lineno) for w in caught]
+    response['output'] = buffer.getvalue()
+    response['duration'] = time.perf_counter() - start
+    return response
+
+
+def _serve_render(request: dict, buffer: io.StringIO) -> dict:
+    try:
+        with change_cwd(request['cwd']), contextlib.redirect_stdout(buffer):
+            writer = render_blueprint(
+                request['blueprint'],
+                tuple(Path(path) for path in request.get('config', [])),
+                request.get('config_select'),
+                None if request.get('output') is None else Path(request['output']),
+                yes=True,
+                template_cache=request.get('template_cache', False),
+                workers=request.get('workers', 1),
+                cache_blueprint=request.get('cache_blueprint', False),
+                interactive=False,
+                environ=request.get('environ', {}),
+            )
+    except Exception as e:
+        return {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+
+    return {
+        'ok': True,
+        'written': writer.written,
+        'unchanged': writer.unchanged,
+        'removed': writer.removed,
+    }
 
 
 @cli.command()
-@click.argument('stack', type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path))
-@click.option('-l', '--live', is_flag=True, help='Run the stack in the foreground')
-def start(stack: Path, live: bool):
+@click.option('--socket', 'socket_path', type=click.Path(dir_okay=False, path_type=Path), default=None, help='path to the Unix socket (default: $VENDORLESS_SOCKET or render.sock in the cache directory)')
+def serve(socket_path: Path | None):
     """
-    Starts a stack.
+    Serves render requests from `vl core render` over a Unix socket.
+
+    Packages stay imported and templates stay compiled between renders. Renders run one at a time,
+    each with a new stack context, and never prompt (settings that aren't configured must have
+    defaults). Restart the daemon after upgrading packages.
     """
-    extra_args = []
-    if not live:
-        extra_args.append('-d')
-    run_command('docker', 'compose', 'up', *extra_args, cwd=stack)
+    if socket_path is None:
+        socket_path = daemon.socket_path()
+    # exit cleanly (removing the socket) when terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    console.print(f"Serving render requests on [bold]{socket_path}[/bold]")
+    try:
+        daemon.serve(serve_request, socket_path)
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+
+
+def expand_stacks(patterns: tuple[str, ...]) -> list[Path]:
+    """
+    Expands stack paths and glob patterns (e.g. ``stacks/*``) to stack directories.
+    """
+    stacks: list[Path] = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(Path(p) for p in glob.glob(pattern) if Path(p, 'docker-compose.yaml').is_file())
+            if not matches:
+                raise click.BadParameter(f"no stacks match '{pattern}'", param_hint='STACKS')
+            stacks.extend(matches)
+        elif Path(pattern).is_dir():
+            stacks.append(Path(pattern))
+        else:
+            raise click.BadParameter(f"'{pattern}' is not a directory", param_hint='STACKS')
+    return list(dict.fromkeys(stacks))
+
+
+def run_concurrently(items: list[Path], jobs: int, func: Callable[[Path], Awaitable[T]]) -> list[T]:
+    """
+    Runs ``func`` for each item (e.g. a stack or a docs page) concurrently, at most ``jobs`` at a
+    time. Results are in the items' order.
+    """
+    async def run_all():
+        semaphore = asyncio.Semaphore(jobs)
+
+        async def run_one(item: Path):
+            async with semaphore:
+                return await func(item)
+
+        return await asyncio.gather(*(run_one(item) for item in items))
+
+    return asyncio.run(run_all())
+
+
+def print_exit_codes(title: str, stacks: list[Path], results: list[ProcessResult], column: str = "Stack") -> int:
+    table = Table(title=title)
+    table.add_column(column, justify="left", no_wrap=True)
+    table.add_column("Exit Code", justify="center", no_wrap=True)
+    table.add_column("Duration", justify="right", no_wrap=True)
+    for stack, result in zip(stacks, results):
+        if not result.ok:
+            console.print(f"[red bold]{stack}[/red bold]")
+            console.print(result.stderr_tail or result.stdout_tail, end="", markup=False, highlight=False)
+        color = "green" if result.ok else "red"
+        exit_code = "timed out" if result.timed_out else str(result.returncode)
+        table.add_row(str(stack), f"[{color}]{exit_code}[/{color}]", f"{result.duration:.1f}s")
+    console.print(table)
+    return max((0 if result.ok else max(result.returncode, 1) for result in results), default=0)
+
+
+stacks_argument = click.argument('stacks', nargs=-1, required=True, type=click.STRING)
+jobs_option = click.option('-j', '--jobs', type=click.IntRange(min=1), default=8, help='number of stacks to act on concurrently')
+timeout_option = click.option('-t', '--timeout', type=click.FloatRange(min=0, min_open=True), default=None, help='seconds before each docker command is terminated')
+
+
+@cli.command()
+@stacks_argument
+@click.option('-l', '--live', is_flag=True, help='Run the stack in the foreground (single stack only)')
+@jobs_option
+@timeout_option
+@click.pass_context
+def start(ctx: click.Context, stacks: tuple[str, ...], live: bool, jobs: int, timeout: float | None):
+    """
+    Starts stacks.
+
+    STACKS are stack directories or glob patterns (e.g. 'stacks/*').
+    """
+    stack_paths = expand_stacks(stacks)
+    if live:
+        if len(stack_paths) != 1:
+            raise click.UsageError("--live can only be used with a single stack")
+        run_command('docker', 'compose', 'up', cwd=stack_paths[0], timeout=timeout, foreground=True)
+        return
+
+    results = run_concurrently(stack_paths, jobs, lambda stack: run_process('docker', 'compose', 'up', '-d', cwd=stack, timeout=timeout))
+    ctx.exit(print_exit_codes('Start', stack_paths, results))
 
 @cli.command()
-@click.argument('stack', type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path))
+@stacks_argument
 @click.option('-d', '--destroy', is_flag=True, help='Delete the volumes')
-def stop(stack: Path, destroy):
+@jobs_option
+@timeout_option
+@click.pass_context
+def stop(ctx: click.Context, stacks: tuple[str, ...], destroy: bool, jobs: int, timeout: float | None):
     """
-    Stop a stack.
+    Stop stacks.
+
+    STACKS are stack directories or glob patterns (e.g. 'stacks/*').
     """
     extra_args = []
     if destroy:
         extra_args.append('-v')
-    run_command('docker', 'compose', 'down', *extra_args, cwd=stack)
+    stack_paths = expand_stacks(stacks)
+    results = run_concurrently(stack_paths, jobs, lambda stack: run_process('docker', 'compose', 'down', *extra_args, cwd=stack, timeout=timeout))
+    ctx.exit(print_exit_codes('Stop', stack_paths, results))
+
+
+def check_lifecycle_status(status: str, exit_code: str) -> int:
+    if status == 'running':
+        return 0
+    elif status == 'exited':
+        if exit_code == "0":
+            # exited successfully -> good
+            return 0
+        else:
+            # exited unsuccessfully -> bad
+            return 2
+    elif status in ['created', 'restarting', 'removing', 'paused']:
+        return 1
+    elif status in [
+        'dead'
+    ]:
+        return 2
+    else:
+        raise ValueError(f'unexpected lifecycle status: {status}')
+
+def check_health_status(status: str) -> int:
+    if status in ['healthy', 'n/a']:
+        return 0
+    elif status == 'starting':
+        return 1
+    elif status == 'unhealthy':
+        return 2
+    else:
+        raise ValueError(f'unexpected health status: {status}')
+
+def format_status(status: str, code: int) -> str:
+    match code:
+        case 0:
+            color = "green"
+        case 1:
+            color = "orange"
+        case 2:
+            color = "red"
+        case _:
+            raise ValueError(f"unexpected code: {code}")
+    return f"[{color}]{status}[/{color}]"
+
+
+INSPECT_FORMAT = '--format={{ index .Config.Labels "com.docker.compose.service" }},{{.Id | printf "%.8s"}},{{.State.Status}},{{if .State.Health}}{{.State.Health.Status}}{{else}}n/a{{end}},{{.State.ExitCode}}'
+INSPECT_PATTERN = re.compile(r'^([\w.-]+)\s*,\s*(\w+)\s*,\s*(\w+)\s*,\s*(\w+)\s*,\s*(\w+)\s*$', re.MULTILINE)
+
+async def stack_service_statuses(stack: Path, timeout: float | None = None) -> list[tuple[str, str, str, str, str]] | None:
+    """
+    The (service, id, lifecycle status, health status, exit code) of each of a stack's containers,
+    or None if docker failed.
+    """
+    result = await run_process('docker', 'compose', 'ps', '-a', '-q', cwd=stack, timeout=timeout, capture=True)
+    if not result.ok:
+        return None
+    container_ids: list[str] = result.stdout.split()
+    if not container_ids:
+        return []
+    return await inspect_containers(stack, container_ids, timeout)
+
+
+async def inspect_containers(stack: Path, container_ids: list[str], timeout: float | None = None) -> list[tuple[str, str, str, str, str]] | None:
+    result = await run_process('docker', 'inspect', INSPECT_FORMAT, *container_ids, cwd=stack, timeout=timeout, capture=True)
+    if not result.ok:
+        return None
+    return INSPECT_PATTERN.findall(result.stdout)
+
 
 @cli.command()
-@click.argument('stack', type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path))
-def status(stack: Path):
+@stacks_argument
+@jobs_option
+@timeout_option
+@click.pass_context
+def status(ctx: click.Context, stacks: tuple[str, ...], jobs: int, timeout: float | None):
     """
-    Check the status of a running stack.
+    Check the status of running stacks.
+
+    STACKS are stack directories or glob patterns (e.g. 'stacks/*').
+    The exit code is the worst status: 0 (healthy), 1 (starting), or 2 (failed, or not running).
     """
+    stack_paths = expand_stacks(stacks)
+    results = run_concurrently(stack_paths, jobs, lambda stack: stack_service_statuses(stack, timeout))
 
-    stdout: str = run_command('docker', 'compose', 'ps', "-q", cwd=stack, return_stdout=True)
-    
-    container_ids: list[str] = stdout.split()
-
-    stdout = run_command(
-        'docker',
-        'inspect',
-        '--format={{ index .Config.Labels "com.docker.compose.service" }},{{.Id | printf "%.8s"}},{{.State.Status}},{{if .State.Health}}{{.State.Health.Status}}{{else}}n/a{{end}},{{.State.ExitCode}}',
-        *container_ids,
-        return_stdout=True,
-        cwd=stack
-    )
-    
-    pattern = re.compile(r'^([\w.-]+)\s*,\s*(\w+)\s*,\s*(\w+)\s*,\s*(\w+)\s*,\s*(\w+)\s*$', re.MULTILINE)
-    matches = pattern.findall(stdout)
     table = Table(title='Service Statuses')
+    table.add_column("Stack", justify="left", no_wrap=True)
     table.add_column("Service", justify="left", no_wrap=True)
     table.add_column("Id", justify="center", no_wrap=True)
     table.add_column("Lifecycle", justify="center", no_wrap=True)
     table.add_column("Health", justify="center", no_wrap=True)
 
-    def check_lifecycle_status(status: str, exit_code: str) -> int:
-        if status == 'running':
-            return 0
-        elif status == 'exited':
-            if exit_code == "0":
-                # exited successfully -> good
-                return 0
-            else:
-                # exited unsuccessfully -> bad
-                return 2
-        elif status in ['created', 'restarting', 'removing', 'paused']:
-            return 1
-        elif status in [
-            'dead'
-        ]:
-            return 2
-        else:
-            raise ValueError(f'unexpected lifecycle status: {status}')
-    
-    def check_health_status(status: str) -> int:
-        if status in ['healthy', 'n/a']:
-            return 0
-        elif status == 'starting':
+    stack_statuses = []
+    for stack, matches in zip(stack_paths, results):
+        if not matches:
+            table.add_row(str(stack), "", "", format_status("error" if matches is None else "not running", 2), "")
+            stack_statuses.append(2)
+            continue
+
+        service_statuses = []
+        for service, id, lifecycle_status, health_status, exit_code in matches:
+            lifecycle = check_lifecycle_status(lifecycle_status, exit_code)
+            health = check_health_status(health_status)
+            table.add_row(
+                str(stack),
+                service,
+                id,
+                format_status(lifecycle_status, lifecycle),
+                format_status(health_status, health),
+            )
+            service_statuses.append(max(lifecycle, health))
+        stack_statuses.append(max(service_statuses))
+    console.print(table)
+    ctx.exit(max(stack_statuses))
+
+
+PROJECT_LABEL = 'com.docker.compose.project'
+SERVICE_LABEL = 'com.docker.compose.service'
+# container events that change a container's status (other than health checks and exits, which
+# are read from the events)
+INSPECT_ACTIONS = {'create', 'start', 'restart', 'pause', 'unpause'}
+
+
+@dataclass
+class ContainerStatus:
+    service: str
+    id: str
+    lifecycle: str = 'created'
+    health: str = 'n/a'
+    exit_code: str = '0'
+    timed_out: bool = False
+    duration: float = 0.0
+    """Seconds from the start of the wait until the container's status last changed."""
+
+    @property
+    def code(self) -> int:
+        """0 (ready), 1 (starting, or timed out), or 2 (failed)."""
+        if self.timed_out:
             return 1
-        elif status == 'unhealthy':
-            return 2
-        else:
-            raise ValueError(f'unexpected health status: {status}')
-    
-    def format_status(status: str, code: int) -> str:
-        match code:
-            case 0:
-                color = "green"
-            case 1:
-                color = "orange"
-            case 2:
-                color = "red"
-            case _:
-                raise ValueError(f"unexpected code: {code}")
-        return f"[{color}]{status}[/{color}]"
-        
-    service_statuses = []
-    for service, id, lifecycle_status, health_status, exit_code in matches:
-        lifecycle = check_lifecycle_status(lifecycle_status, exit_code)
-        health = check_health_status(health_status)
-        status = max(lifecycle, health)
-        table.add_row(
-            service,
-            id,
-            format_status(lifecycle_status, lifecycle),
-            format_status(health_status, health),
-        )
-        console.print(table)
-        service_statuses.append(status)
-    if len(service_statuses) == 0:
-        return 2
-    return max(service_statuses)
+        lifecycle = check_lifecycle_status(self.lifecycle, self.exit_code)
+        if self.lifecycle == 'exited':
+            return lifecycle
+        return max(lifecycle, check_health_status(self.health))
+
+    @property
+    def status(self) -> str:
+        if self.timed_out:
+            return 'timed out'
+        if self.lifecycle == 'exited':
+            return f'exited ({self.exit_code})'
+        if self.health != 'n/a':
+            return self.health
+        return self.lifecycle
+
+
+async def stack_project_name(stack: Path, timeout: float | None = None) -> str | None:
+    result = await run_process('docker', 'compose', 'config', '--format', 'json', cwd=stack, timeout=timeout, capture=True)
+    if not result.ok:
+        return None
+    return json.loads(result.stdout).get('name')
+
+
+async def wait_for_stack(stack: Path, timeout: float | None = None, service_timeouts: dict[str, float] | None = None) -> list[ContainerStatus] | None:
+    """
+    Waits until every container of a stack is ready (running and healthy, or exited with 0), one
+    fails (unhealthy, or exited with an error), or a timeout expires. Returns the containers'
+    statuses, or None if docker failed.
+
+    Status changes are read from ``docker events``, so docker is only polled for the initial
+    statuses (and when containers are created or started). Only the containers that exist when
+    the wait starts, and those created during it, are waited for; if there aren't any, the stack
+    isn't running and the result is empty.
+
+    Parameters
+    ----------
+    timeout
+        Seconds to wait for all of the containers.
+    service_timeouts
+        Seconds to wait for each service's containers.
+    """
+    service_timeouts = service_timeouts or {}
+    start = time.monotonic()
+    project = await stack_project_name(stack)
+    if project is None:
+        return None
+
+    containers: dict[str, ContainerStatus] = {}
+
+    def update(id: str, service: str, **status):
+        container = containers[id]
+        code = container.code
+        for name, value in status.items():
+            setattr(container, name, value)
+        if container.code != code:
+            container.duration = time.monotonic() - start
+
+    # subscribe before taking the initial statuses; --since replays anything that happened while
+    # docker events was starting
+    events = await asyncio.create_subprocess_exec(
+        'docker', 'events', '--format', '{{json .}}', '--since', f'{time.time():.3f}',
+        '--filter', 'type=container', '--filter', f'label={PROJECT_LABEL}={project}',
+        stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+        cwd=stack,
+    )
+    try:
+        statuses = await stack_service_statuses(stack)
+        if statuses is None:
+            return None
+        for service, id, lifecycle, health, exit_code in statuses:
+            containers[id] = ContainerStatus(service, id)
+            update(id, service, lifecycle=lifecycle, health=health, exit_code=exit_code)
+
+        while True:
+            if not containers:
+                return []
+            codes = [container.code for container in containers.values()]
+            if 2 in codes or any(container.timed_out for container in containers.values()):
+                break  # fail fast
+            if codes and max(codes) == 0:
+                break
+
+            elapsed = time.monotonic() - start
+            deadlines = [] if timeout is None else [timeout]
+            for container in containers.values():
+                limits = [limit for limit in (timeout, service_timeouts.get(container.service)) if limit is not None]
+                if container.code == 1 and limits:
+                    if elapsed >= min(limits):
+                        update(container.id, container.service, timed_out=True)
+                    deadlines.append(min(limits))
+            if any(container.timed_out for container in containers.values()):
+                continue
+
+            try:
+                line = await asyncio.wait_for(events.stdout.readline(), min(deadlines) - elapsed if deadlines else None)
+            except asyncio.TimeoutError:
+                continue
+            if not line:
+                return None  # docker events exited
+
+            event = json.loads(line)
+            action: str = event.get('Action', '')
+            actor = event.get('Actor', {})
+            id, attributes = actor.get('ID', '')[:8], actor.get('Attributes', {})
+            service = attributes.get(SERVICE_LABEL, '')
+            if action != 'create' and id not in containers:
+                continue  # e.g. a container that was replaced before the wait
+            if action.startswith('health_status:'):
+                update(id, service, health=action.split(':', 1)[1].strip())
+            elif action == 'die':
+                update(id, service, lifecycle='exited', health='n/a', exit_code=attributes.get('exitCode', '0'))
+            elif action == 'destroy':
+                del containers[id]
+            elif action in INSPECT_ACTIONS:
+                for service, id, lifecycle, health, exit_code in await inspect_containers(stack, [actor['ID']]) or []:
+                    containers.setdefault(id, ContainerStatus(service, id))
+                    update(id, service, lifecycle=lifecycle, health=health, exit_code=exit_code)
+        return list(containers.values())
+    finally:
+        if events.returncode is None:
+            events.terminate()
+        await events.wait()
+
+
+def parse_service_timeouts(ctx: click.Context, param: click.Parameter, values: tuple[str, ...]) -> dict[str, float]:
+    service_timeouts = {}
+    for value in values:
+        service, _, seconds = value.partition('=')
+        try:
+            service_timeouts[service] = float(seconds)
+        except ValueError:
+            raise click.BadParameter(f"expected SERVICE=SECONDS, got '{value}'")
+        if not service:
+            raise click.BadParameter(f"'{value}' doesn't name a service")
+        if not service_timeouts[service] >= 0:
+            raise click.BadParameter(f"the timeout of {service} must be at least 0")
+    return service_timeouts
+
+
+@cli.command()
+@stacks_argument
+@click.option('-t', '--timeout', type=click.FloatRange(min=0), default=None, help='seconds to wait for all services')
+@click.option('-s', '--service-timeout', 'service_timeouts', multiple=True, callback=parse_service_timeouts, metavar='SERVICE=SECONDS', help='seconds to wait for a service (can be repeated)')
+@jobs_option
+@click.pass_context
+def wait(ctx: click.Context, stacks: tuple[str, ...], timeout: float | None, service_timeouts: dict[str, float], jobs: int):
+    """
+    Wait for stacks' services to be healthy (or to exit successfully).
+
+    STACKS are stack directories or glob patterns (e.g. 'stacks/*').
+    Waiting stops as soon as a service fails. The exit code is the worst status: 0 (ready),
+    1 (timed out), or 2 (failed, e.g. unhealthy or exited with an error, or not running).
+    """
+    stack_paths = expand_stacks(stacks)
+    results = run_concurrently(stack_paths, jobs, lambda stack: wait_for_stack(stack, timeout, service_timeouts))
+
+    table = Table(title='Wait')
+    table.add_column("Stack", justify="left", no_wrap=True)
+    table.add_column("Service", justify="left", no_wrap=True)
+    table.add_column("Id", justify="center", no_wrap=True)
+    table.add_column("Status", justify="center", no_wrap=True)
+    table.add_column("Duration", justify="right", no_wrap=True)
+
+    stack_statuses = []
+    for stack, containers in zip(stack_paths, results):
+        if not containers:
+            table.add_row(str(stack), "", "", format_status("error" if containers is None else "not running", 2), "")
+            stack_statuses.append(2)
+            continue
+        for container in containers:
+            table.add_row(str(stack), container.service, container.id, format_status(container.status, container.code), f"{container.duration:.1f}s")
+        stack_statuses.append(max(container.code for container in containers))
+    console.print(table)
+    ctx.exit(max(stack_statuses))
     
 
 @cli.group()
@@ -262,45 +798,65 @@ def new(output_dir: str):
     """
     Create a new package. 
     """
+    from cookiecutter.main import cookiecutter
+
     click.echo("Initializing new package.")
     templates_path = importlib.resources.files('vendorless.core.templates')
     cookiecutter(str(templates_path / 'package'), output_dir=output_dir)
     click.echo("New package initialized.")
 
 
-def run_command(*command: str, return_stdout: bool=False, input: str=None, cwd=None, env=None) -> str:
-    process = subprocess.Popen(
-        command,
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        universal_newlines=True,
-        bufsize=1,
+@package.command()
+@click.argument('packages', nargs=-1, required=True)
+@click.option('-o', '--output', type=click.Path(file_okay=False, dir_okay=True, path_type=Path), default=Path('bundle'), help='path to the bundle (replaced if it exists)')
+@click.option('--python', type=str, default=sys.executable, help='interpreter the bundle is built for (default: this one)')
+@click.option('--pip-arg', 'pip_args', multiple=True, help="extra argument for 'pip install' (can be repeated, e.g. --pip-arg=--no-index)")
+def bundle(packages: tuple[str, ...], output: Path, python: str, pip_args: tuple[str, ...]):
+    """
+    Install packages and their dependencies into a self-contained bundle.
+
+    Run vl from the bundle with 'PYTHONPATH=<bundle>/site python -m vendorless.core.cli'. The Docker
+    image uses the bundle in /bundle if it includes the requested packages.
+    """
+    from vendorless.core import bundle as bundles
+
+    try:
+        manifest = bundles.build(list(packages), output, python, pip_args)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    console.print(f"Bundled {len(manifest['distributions'])} distributions for Python {manifest['python']} in {output}")
+
+
+def run_command(*command: str, return_stdout: bool=False, input: str=None, cwd=None, env=None, timeout: float | None=None, foreground: bool=False) -> str:
+    """
+    Runs a command, echoing its output unless ``return_stdout`` is set. ``foreground`` commands
+    use the terminal directly (see :func:`run_process`).
+
+    Raises RuntimeError if the command fails (when echoing) or times out.
+    """
+    result = run(
+        *command,
+        input=input,
         cwd=cwd,
         env=env,
+        timeout=timeout,
+        capture=return_stdout,
+        echo=not return_stdout,
+        foreground=foreground,
     )
-
+    if result.timed_out:
+        raise RuntimeError(f"'{' '.join(command)}' timed out after {timeout}s")
     if not return_stdout:
-        if input:
-            process.stdin.write(input)
-            process.stdin.flush()
-            process.stdin.close()
-            
-        with process.stdout:
-            for line in iter(process.stdout.readline, ""):
-                console.print(line, end="")
-        process.wait()
-        if process.returncode != 0:
-            raise RuntimeError()
+        if result.returncode != 0:
+            raise RuntimeError(f"'{' '.join(command)}' failed with exit code {result.returncode}")
         return ""
     else:
-        stdout, stderr = process.communicate()
-        return stdout
+        return result.stdout
 
 
 @package.command()
 def docs_serve():
-    run_command('mkdocs', 'serve')
+    run_command('mkdocs', 'serve', foreground=True)
 
 @package.command()
 def docs_build():
@@ -316,44 +872,114 @@ def extract_blocks(filepath: str, block: str):
         blocks += ''.join(match.groups())
     return blocks
 
-@package.command()
-@click.argument('filepath', type=click.Path(exists=True, file_okay=True, dir_okay=False))
-@click.option('-t', '--temp-dir', is_flag=True)
-def docs_run(filepath: str, temp_dir: bool):
-
+def docs_page_script(filepath: Path) -> tuple[str, str]:
+    """
+    The shell script (the ``$`` lines of the ``console`` blocks) of a docs page, and its input
+    (the ``salt`` blocks' answers).
+    """
     bash_script = extract_blocks(filepath=filepath, block="console")
     bash_script = ''.join(l.removeprefix("$").strip(' ') for l in bash_script.splitlines(keepends=True) if l.startswith("$"))
 
-
     input = extract_blocks(filepath=filepath, block="salt")
     input = ''.join(l.split(':', maxsplit=1)[1].strip(' ') for l in input.splitlines(keepends=True))
+    return bash_script, input
+
+
+def expand_docs_pages(paths: tuple[Path, ...]) -> list[Path]:
+    """
+    Expands docs directories to the markdown files in them.
+    """
+    pages: list[Path] = []
+    for path in paths:
+        if path.is_dir():
+            pages.extend(sorted(path.rglob('*.md')))
+        else:
+            pages.append(path)
+    return list(dict.fromkeys(pages))
+
+
+DOCS_RUN_CACHE_SIZE = 1024  # pages
 
-    tmpdir = tempfile.TemporaryDirectory(prefix='vendorless.core.', delete=not temp_dir)
+
+def load_docs_run_cache() -> dict[str, dict]:
+    """
+    The scripts extracted from docs pages, and whether they passed, keyed by the pages' hashes.
+    """
+    try:
+        with open(cache_dir() / 'docs-run.json') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_docs_run_cache(cache: dict[str, dict]):
+    path = cache_dir() / 'docs-run.json'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # the most recently used pages are at the end
+    cache = dict(list(cache.items())[-DOCS_RUN_CACHE_SIZE:])
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}')
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, path)
+
+
+@package.command()
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True, file_okay=True, dir_okay=True, path_type=Path))
+@click.option('-t', '--temp-dir', is_flag=True, help='run a single page in a temporary directory (more than one page always run in temporary directories)')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=4, help='number of pages to run concurrently')
+@click.option('--timeout', type=click.FloatRange(min=0, min_open=True), default=None, help='seconds before each page is terminated')
+@click.option('--changed-only', is_flag=True, help="skip pages that haven't changed since they last passed")
+@click.pass_context
+def docs_run(ctx: click.Context, paths: tuple[Path, ...], temp_dir: bool, jobs: int, timeout: float | None, changed_only: bool):
+    """
+    Run the console blocks of docs pages.
+
+    PATHS are markdown files or directories of them. Each page runs as a bash script, with the
+    answers in its salt blocks as input.
+    """
+    pages = expand_docs_pages(paths)
+    cache = load_docs_run_cache()
+    digests = {}
+    for page in pages:
+        digest = hash_file(page)
+        entry = cache.pop(digest, None)  # re-inserted so it's the most recently used
+        if entry is None:
+            script, input = docs_page_script(page)
+            entry = {'script': script, 'input': input, 'passed': False}
+        cache[digest] = entry
+        digests[page] = digest
+
+    # pages run concurrently in their own directories; a single page runs in the foreground
+    # (decided before skipping pages, so the directory a page runs in doesn't depend on the cache)
+    sandbox = temp_dir or len(pages) > 1
+    skipped = [page for page in pages if changed_only and cache[digests[page]]['passed']]
+    pages = [page for page in pages if page not in skipped]
 
     env = os.environ.copy()
     env.pop("VIRTUAL_ENV", None)  # don't modify the current environment
 
-    if not temp_dir:
-        run_command(
-            'bash', '-c', f"set -x\n{bash_script}",
-            input=input,
-            env=env,
-        )
-    else:
-        with tmpdir:
-            run_command(
-                'bash', '-c', f"set -x\n{bash_script}",
-                input=input,
-                cwd=tmpdir.name,
-                env=env,
-            )
-            shutil.rmtree(tmpdir.name)
-        
-    
+    async def run_page(page: Path) -> ProcessResult:
+        entry = cache[digests[page]]
+        command = ('bash', '-c', f"set -x\n{entry['script']}")
+        if not sandbox:
+            return await run_process(*command, input=entry['input'], env=env, timeout=timeout, echo=True)
+        with tempfile.TemporaryDirectory(prefix='vendorless.core.', ignore_cleanup_errors=True) as tmpdir:
+            return await run_process(*command, input=entry['input'], cwd=tmpdir, env=env, timeout=timeout, echo=len(pages) == 1)
+
+    results = run_concurrently(pages, jobs, run_page)
+    for page, result in zip(pages, results):
+        cache[digests[page]]['passed'] = result.ok
+    save_docs_run_cache(cache)
+
+    if skipped:
+        console.print(f"Skipped {len(skipped)} unchanged page{'s' if len(skipped) != 1 else ''} that passed")
+    ctx.exit(print_exit_codes('Docs', pages, results, column='Page'))
+
+
 @package.command()
 def publish():
     run_command('poetry', 'build')
-    run_command('poetry', 'publish')
+    run_command('poetry', 'publish', foreground=True)
 
 
 
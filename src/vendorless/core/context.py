@@ -0,0 +1,83 @@
+import contextvars
+import functools
+import itertools
+import weakref
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .parameters import ConfigurationParameter
+    from .service_template import ServiceTemplate
+
+
+_generations = itertools.count()
+
+
+class StackContext:
+    """
+    The service templates and configuration parameters of a stack.
+
+    Service templates and configuration parameters register themselves with the current context
+    when they're created, and rendering and resolving the configuration only see the objects in the
+    current context. Using a new context for each blueprint lets one process render many stacks::
+
+        with StackContext() as context:
+            runpy.run_path('blueprint.py')
+            Configuration(config, None).resolve()
+            ServiceTemplate.render_stack()
+
+    Objects are held weakly, so objects that the blueprint doesn't keep a reference to aren't rendered.
+    """
+
+    def __init__(self) -> None:
+        self.service_templates: weakref.WeakValueDictionary[int, 'ServiceTemplate'] = weakref.WeakValueDictionary()
+        # registration order (used for printing scopes when resolving) and lookup by keys
+        self.configuration_parameters: weakref.WeakValueDictionary[int, 'ConfigurationParameter'] = weakref.WeakValueDictionary()
+        self.configuration_parameters_by_keys: weakref.WeakValueDictionary[tuple[str, ...], 'ConfigurationParameter'] = weakref.WeakValueDictionary()
+        self._counter = itertools.count()
+        self._tokens: list[contextvars.Token] = []
+        self.generation = next(_generations)
+        """
+        Changed whenever a parameter or configuration parameter is assigned in this context.
+        Computed and linked parameters cache their values with the generation they were computed
+        in, so an assignment invalidates the cached values of this context, but not of others.
+        """
+
+    def invalidate(self):
+        # generations are unique across contexts, so a value cached in one context is never
+        # taken to be valid in another; next() is atomic, so threads can't reuse a generation
+        self.generation = next(_generations)
+
+    def add_service_template(self, service_template: 'ServiceTemplate'):
+        self.service_templates[id(service_template)] = service_template
+
+    def add_configuration_parameter(self, configuration_parameter: 'ConfigurationParameter'):
+        self.configuration_parameters[next(self._counter)] = configuration_parameter
+        self.configuration_parameters_by_keys.setdefault(configuration_parameter.keys, configuration_parameter)
+
+    def __enter__(self) -> 'StackContext':
+        self._tokens.append(_current_context.set(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        _current_context.reset(self._tokens.pop())
+
+
+# used when no context has been entered (e.g. running a blueprint directly)
+_default_context = StackContext()
+_current_context: contextvars.ContextVar[StackContext] = contextvars.ContextVar('vendorless_stack_context', default=_default_context)
+
+
+def current_context() -> StackContext:
+    return _current_context.get()
+
+
+def with_stack_context(func):
+    """
+    Runs each call of ``func`` in a new :class:`StackContext`, so the objects of previously
+    rendered blueprints (e.g. by the same process) aren't part of its stack.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with StackContext():
+            return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,123 @@
+"""
+A render daemon (``vl core serve``) that keeps packages imported and templates compiled between renders.
+
+Requests and responses are JSON objects, one per line, over a Unix domain socket. Every request
+has a ``command`` (``ping``, ``render``, or ``shutdown``); every response has ``ok`` and, if it's
+false, an ``error``.
+"""
+import json
+import os
+import socket
+import socketserver
+import threading
+from pathlib import Path
+from typing import Callable
+
+from .utils import cache_dir
+
+SOCKET_ENV = 'VENDORLESS_SOCKET'
+
+
+def socket_path() -> Path:
+    """
+    The daemon's socket (``$VENDORLESS_SOCKET``, or ``render.sock`` in the cache directory by default).
+    """
+    if SOCKET_ENV in os.environ:
+        return Path(os.environ[SOCKET_ENV])
+    return cache_dir() / 'render.sock'
+
+
+class DaemonNotRunning(ConnectionError):
+    """Raised when no daemon is listening on the socket."""
+
+
+def request(message: dict, path: Path | None = None, timeout: float | None = None) -> dict:
+    """
+    Sends a request to the daemon and returns its response.
+
+    Raises
+    ------
+    DaemonNotRunning
+        If no daemon is listening on ``path``.
+    """
+    if path is None:
+        path = socket_path()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(path))
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise DaemonNotRunning(f"no daemon is listening on {path}") from e
+        with sock.makefile('rwb') as f:
+            f.write(json.dumps(message).encode() + b'\n')
+            f.flush()
+            line = f.readline()
+    if not line:
+        raise ConnectionError("the daemon closed the connection without responding")
+    return json.loads(line)
+
+
+def is_running(path: Path | None = None) -> bool:
+    try:
+        return request({'command': 'ping'}, path, timeout=1.0)['ok']
+    except (OSError, ValueError):
+        return False
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: 'RenderServer'
+
+    def handle(self):
+        # a connection can send several requests
+        for line in self.rfile:
+            try:
+                message = json.loads(line)
+                if message.get('command') == 'shutdown':
+                    response = {'ok': True}
+                    # shutdown() waits for serve_forever() to return, so it can't be called from its thread
+                    threading.Thread(target=self.server.shutdown).start()
+                else:
+                    response = self.server.handler(message)
+            except Exception as e:
+                response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+
+class RenderServer(socketserver.UnixStreamServer):
+    """
+    Serves requests one at a time; renders change the working directory, which is shared by the
+    whole process.
+    """
+
+    def __init__(self, path: Path, handler: Callable[[dict], dict]) -> None:
+        self.handler = handler
+        # only the user may connect; the socket is created with these permissions, so there's no
+        # window in which others can connect
+        umask = os.umask(0o177)
+        try:
+            super().__init__(str(path), _RequestHandler)
+        finally:
+            os.umask(umask)
+
+
+def serve(handler: Callable[[dict], dict], path: Path | None = None):
+    """
+    Serves requests until a ``shutdown`` request (or an exception, e.g. KeyboardInterrupt).
+
+    ``handler`` is called with each request (other than ``shutdown``) and returns its response.
+    """
+    if path is None:
+        path = socket_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        if is_running(path):
+            raise RuntimeError(f"a daemon is already listening on {path}")
+        path.unlink()  # left behind by a daemon that was killed
+
+    server = RenderServer(path, handler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        path.unlink(missing_ok=True)
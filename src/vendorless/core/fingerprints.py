@@ -0,0 +1,139 @@
+"""
+Fingerprints of a render's inputs, recorded in the lock file so ``vl core render --check`` can tell
+whether rendering again would change the stack without running the blueprint.
+
+This module is imported by ``--check``, so it mustn't import Jinja or the service templates.
+"""
+import contextlib
+import hashlib
+import importlib.machinery
+import importlib.metadata
+import importlib.util
+import io
+import json
+from pathlib import Path
+
+from .output import hash_file
+from .parameters import Configuration
+
+def find_spec(name: str) -> importlib.machinery.ModuleSpec | None:
+    """
+    The spec of a module, found without importing it or its parent packages.
+
+    ``importlib.util.find_spec`` imports the parent packages of a submodule, which runs their
+    ``__init__`` (e.g. importing the service templates and Jinja). Only the top-level package is
+    looked up that way (which doesn't import it); submodules are looked up on their parent's path.
+    """
+    top, *parts = name.split('.')
+    try:
+        spec = importlib.util.find_spec(top)
+        for i in range(len(parts)):
+            if spec is None or spec.submodule_search_locations is None:
+                return None
+            spec = importlib.machinery.PathFinder.find_spec('.'.join([top, *parts[:i + 1]]), list(spec.submodule_search_locations))
+    except (ImportError, ValueError):
+        return None
+    return spec
+
+
+def blueprint_source(blueprint: str) -> Path | None:
+    """
+    The source file of a blueprint (a .py path or a module name).
+    """
+    if blueprint.endswith('.py'):
+        return Path(blueprint).resolve()
+    spec = find_spec(blueprint)
+    if spec is None or spec.origin is None or not Path(spec.origin).is_file():
+        return None
+    return Path(spec.origin)
+
+
+def configuration_fingerprint(configuration: dict) -> str:
+    return hashlib.sha256(json.dumps(configuration, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def templates_fingerprint(packages: list[str]) -> str:
+    """
+    A hash of the contents of the packages' templates, found without importing the packages.
+    """
+    h = hashlib.sha256()
+    for package in sorted(packages):
+        h.update(f'{package}\0'.encode())
+        spec = find_spec(package)
+        for location in (spec.submodule_search_locations or []) if spec is not None else []:
+            templates = Path(location) / 'templates'
+            if not templates.is_dir():
+                continue
+            for path in sorted(templates.rglob('*')):
+                if path.is_file() and '__pycache__' not in path.parts:
+                    h.update(f'{path.relative_to(templates).as_posix()}\0{hash_file(path)}\0'.encode())
+    return h.hexdigest()
+
+
+def fingerprints(source: Path | None, configuration: dict, packages: list[str]) -> dict[str, str | None]:
+    """
+    The fingerprints recorded in the lock file (package versions are recorded separately).
+    """
+    return {
+        'blueprint': hash_file(source) if source is not None and source.is_file() else None,
+        'configuration': configuration_fingerprint(configuration),
+        'templates': templates_fingerprint(packages),
+    }
+
+
+def check(lock: dict, blueprint: str, config: list[Path], config_select: str | None, environ: dict[str, str], lock_path: Path) -> str | None:
+    """
+    Checks whether rendering ``blueprint`` with a configuration would change a stack.
+
+    Returns None if the stack is up to date, or the reason it's stale.
+    """
+    recorded = lock.get('fingerprints')
+    if not recorded:
+        return "the lock file has no fingerprints"
+
+    source = blueprint_source(blueprint)
+    if blueprint.endswith('.py'):
+        blueprint = str(Path(blueprint).resolve())
+    if lock.get('blueprint') != blueprint:
+        return f"the stack was rendered from a different blueprint ({lock.get('blueprint')})"
+    if source is None or not source.is_file() or hash_file(source) != recorded.get('blueprint'):
+        return "the blueprint changed"
+
+    for package, version in sorted(lock.get('packages', {}).items()):
+        try:
+            installed = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            return f"{package} isn't installed"
+        if installed != version:
+            return f"{package} changed ({version} -> {installed})"
+
+    if templates_fingerprint(list(lock.get('packages', {}))) != recorded.get('templates'):
+        return "templates changed"
+
+    for key, digest in sorted((lock.get('files') or {}).items()):
+        try:
+            if hash_file(lock_path.parent / key) != digest:
+                return f"{key} was modified"
+        except FileNotFoundError:
+            return f"{key} is missing"
+
+    rendered_configuration = lock.get('configuration') or {}
+    if configuration_fingerprint(rendered_configuration) != recorded.get('configuration'):
+        return "the lock file's configuration was edited"
+
+    # the configuration the render would start from; without config files, it reloads the lock file's
+    if not config:
+        config, config_select = [lock_path], 'configuration'
+    with contextlib.redirect_stdout(io.StringIO()):
+        inputs = Configuration(config, config_select, environ)
+        rendered = Configuration(None, None, {})
+    rendered._flatten(rendered_configuration, (), 'lock')
+    sources = lock.get('configuration_sources') or {}
+
+    for keys, value in inputs._values.items():
+        if not rendered.has(keys) or rendered.get(keys) != value:
+            return f"setting {'.'.join(keys)} changed"
+    for keys in rendered._values:
+        if not inputs.has(keys) and sources.get('.'.join(keys)) not in ('prompt', 'default'):
+            return f"setting {'.'.join(keys)} is no longer configured"
+    return None
@@ -0,0 +1,358 @@
+import errno
+import hashlib
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import IO, Iterator
+from importlib.resources.abc import Traversable
+from pathlib import Path, PurePosixPath
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _hash_stream(f) -> str:
+    h = hashlib.sha256()
+    while chunk := f.read(CHUNK_SIZE):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_file(path: Path | Traversable) -> str:
+    """
+    The SHA-256 of a file's contents.
+    """
+    with path.open('rb') as f:
+        return _hash_stream(f)
+
+
+def _copy_file(src: Path, dst: Path):
+    """
+    Copies a file in the kernel, without reading it into memory.
+
+    copy_file_range() can share the data (a reflink) on filesystems that support it (e.g. btrfs
+    and XFS). Otherwise (e.g. across filesystems) shutil.copyfile() uses sendfile() where it can.
+    """
+    if hasattr(os, 'copy_file_range'):
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                return
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM):
+                    raise
+    shutil.copyfile(src, dst)
+
+
+def _replace(tmp: Path, dst: Path):
+    """
+    Renames ``tmp`` to ``dst``, keeping ``dst``'s permissions if it exists (e.g. an executable
+    script, or a secret that's only readable by its owner).
+    """
+    try:
+        shutil.copymode(dst, tmp)
+    except FileNotFoundError:
+        pass
+    os.replace(tmp, dst)
+
+
+class _HashingWriter(io.RawIOBase):
+    def __init__(self, raw: IO[bytes]) -> None:
+        self.raw = raw
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.hash.update(b)
+        self.size += len(b)
+        return self.raw.write(b)
+
+
+class StackWriter:
+    """
+    Writes a rendered stack to a directory.
+
+    Files whose contents haven't changed are left untouched (so their mtimes don't change).
+    Changed files are written to a temporary file and renamed into place.
+
+    Parameters
+    ----------
+    root
+        The stack's output directory.
+    previous_hashes
+        The file hashes recorded in the stack's lock file by the previous render. If they aren't
+        known (e.g. the lock file predates them), the files in the output directory (but not its
+        subdirectories) are taken to be the previous render's.
+    """
+
+    def __init__(self, root: Path, previous_hashes: dict[str, str] | None = None) -> None:
+        self.root = root
+        self.previous_hashes = previous_hashes or {}
+        if previous_hashes is None:
+            self.previous_files = sorted(p.name for p in root.iterdir() if p.is_file()) if root.is_dir() else []
+        else:
+            self.previous_files = list(previous_hashes)
+        # hashes of the files on disk that are copied, so an asset that's copied by many service
+        # templates is only read once; destinations are always hashed, since they can be edited
+        # without changing their size or mtime
+        self._source_hashes: dict[tuple[Path, int, int], str] = {}
+        # the first copy in the stack of each copied file, by hash
+        self._copies: dict[str, Path] = {}
+        self.hashes: dict[str, str] = {}
+        self.written: list[str] = []
+        self.unchanged: list[str] = []
+        self.removed: list[str] = []
+
+    def write(self, path: str | PurePosixPath, content: str | bytes | Traversable, *, record: bool = True):
+        """
+        Writes ``content`` (text, bytes, or a resource to copy) to ``path`` if it changed.
+        """
+        key = PurePosixPath(path).as_posix()
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+
+        if isinstance(content, bytes):
+            digest = hashlib.sha256(content).hexdigest()
+            size = len(content)
+        elif isinstance(content, Path):
+            digest = self._hash_source(content)
+            size = content.stat().st_size
+        else:
+            digest = hash_file(content)
+            size = None
+
+        if record:
+            self.hashes[key] = digest
+
+        dst = self.root / key
+        if self._is_unchanged(key, dst, digest, size):
+            self.unchanged.append(key)
+            if isinstance(content, Path):
+                self._copies.setdefault(digest, dst)
+            return
+
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f'.{dst.name}.{os.getpid()}.tmp')
+        try:
+            if isinstance(content, Path):
+                # later copies of a shared asset are made from its first copy, which is on the
+                # stack's filesystem, so copy_file_range() can reflink them even if the asset
+                # itself is on another filesystem (e.g. the package's)
+                _copy_file(self._copies.get(digest, content), tmp)
+            else:
+                with open(tmp, 'wb') as f:
+                    if isinstance(content, bytes):
+                        f.write(content)
+                    else:
+                        with content.open('rb') as src:
+                            while chunk := src.read(CHUNK_SIZE):
+                                f.write(chunk)
+            _replace(tmp, dst)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        if isinstance(content, Path):
+            self._copies.setdefault(digest, dst)
+        self.written.append(key)
+
+    @contextmanager
+    def open(self, path: str | PurePosixPath, *, record: bool = True) -> Iterator[IO[str]]:
+        """
+        Opens ``path`` for writing text incrementally (e.g. by a YAML emitter).
+
+        The text is streamed to a temporary file, which replaces ``path`` only if the contents changed.
+        """
+        key = PurePosixPath(path).as_posix()
+        dst = self.root / key
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f'.{dst.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp, 'wb') as raw:
+                hashing = _HashingWriter(raw)
+                with io.TextIOWrapper(io.BufferedWriter(hashing, CHUNK_SIZE), encoding='utf-8', newline='') as f:
+                    yield f
+            digest = hashing.hash.hexdigest()
+            if record:
+                self.hashes[key] = digest
+            if self._is_unchanged(key, dst, digest, hashing.size):
+                tmp.unlink()
+                self.unchanged.append(key)
+            else:
+                _replace(tmp, dst)
+                self.written.append(key)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    def _hash_source(self, path: Path) -> str:
+        st = path.stat()
+        key = (path, st.st_size, st.st_mtime_ns)
+        if key not in self._source_hashes:
+            self._source_hashes[key] = hash_file(path)
+        return self._source_hashes[key]
+
+    def _is_unchanged(self, key: str, dst: Path, digest: str, size: int | None) -> bool:
+        previous = self.previous_hashes.get(key)
+        if previous is not None and previous != digest:
+            return False
+        try:
+            if size is not None and dst.stat().st_size != size:
+                return False
+            return hash_file(dst) == digest
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            return False
+
+    def leftovers(self) -> list[str]:
+        """
+        Files from the previous render that were not rendered this time.
+        """
+        rendered = {*self.hashes, *self.written, *self.unchanged}
+        return sorted(
+            key for key in self.previous_files
+            if key not in rendered and (self.root / key).is_file()
+        )
+
+    def remove(self, keys: list[str]):
+        for key in keys:
+            (self.root / key).unlink(missing_ok=True)
+            self.removed.append(key)
+
+    def summary(self) -> str:
+        return f"{len(self.written)} written, {len(self.unchanged)} unchanged, {len(self.removed)} removed"
+
+
+class _HashingReader(io.RawIOBase):
+    def __init__(self, raw: IO[bytes]) -> None:
+        self.raw = raw
+        self.hash = hashlib.sha256()
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        b = self.raw.read(size)
+        self.hash.update(b)
+        return b
+
+
+class _AbortableWriter(io.RawIOBase):
+    def __init__(self, raw: IO[bytes]) -> None:
+        self.raw = raw
+        self.aborted = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        if not self.aborted:
+            self.raw.write(b)
+        return len(b)
+
+
+class TarWriter:
+    """
+    Writes a rendered stack to a tar archive streamed to ``fileobj`` (e.g. stdout).
+
+    Files are added as they're rendered, so nothing is written to disk. It has the same interface
+    as :class:`StackWriter`; every file is written, and there are no leftovers.
+
+    Parameters
+    ----------
+    fileobj
+        The binary stream to write the archive to.
+    compression
+        ``''`` (none), ``'gz'``, ``'bz2'``, or ``'xz'``.
+    """
+
+    def __init__(self, fileobj: IO[bytes], compression: str = '') -> None:
+        self.output = _AbortableWriter(fileobj)
+        self.tar = tarfile.open(fileobj=self.output, mode=f'w|{compression}')
+        # SOURCE_DATE_EPOCH makes archives reproducible
+        self.mtime = int(os.environ.get('SOURCE_DATE_EPOCH', time.time()))
+        self.hashes: dict[str, str] = {}
+        self.written: list[str] = []
+        self.unchanged: list[str] = []
+        self.removed: list[str] = []
+
+    def _add(self, key: str, f: IO[bytes], size: int):
+        info = tarfile.TarInfo(key)
+        info.size = size
+        info.mtime = self.mtime
+        info.mode = 0o644
+        self.tar.addfile(info, f)
+        self.written.append(key)
+
+    def write(self, path: str | PurePosixPath, content: str | bytes | Traversable, *, record: bool = True):
+        key = PurePosixPath(path).as_posix()
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        if isinstance(content, bytes):
+            digest = hashlib.sha256(content).hexdigest()
+            self._add(key, io.BytesIO(content), len(content))
+        elif isinstance(content, Path):
+            # streamed into the archive, hashing it on the way
+            with content.open('rb') as f:
+                reader = _HashingReader(f)
+                self._add(key, reader, os.fstat(f.fileno()).st_size)
+            digest = reader.hash.hexdigest()
+        else:
+            # the size of other resources (e.g. in zip files) isn't known without reading them, so
+            # they're spooled (to a temporary file if they're large) and streamed from there
+            with content.open('rb') as f, tempfile.SpooledTemporaryFile(CHUNK_SIZE) as spool:
+                reader = _HashingReader(f)
+                shutil.copyfileobj(reader, spool, CHUNK_SIZE)
+                size = spool.tell()
+                spool.seek(0)
+                self._add(key, spool, size)
+            digest = reader.hash.hexdigest()
+
+        if record:
+            self.hashes[key] = digest
+
+    @contextmanager
+    def open(self, path: str | PurePosixPath, *, record: bool = True) -> Iterator[IO[str]]:
+        buffer = io.BytesIO()
+        with io.TextIOWrapper(buffer, encoding='utf-8', newline='', write_through=True) as f:
+            yield f
+            f.flush()
+            self.write(path, buffer.getvalue(), record=record)
+
+    def leftovers(self) -> list[str]:
+        return []
+
+    def remove(self, keys: list[str]):
+        pass
+
+    def summary(self) -> str:
+        return f"{len(self.written)} archived"
+
+    def close(self):
+        self.tar.close()
+
+    def abort(self):
+        """
+        Closes the archive without finalising it (nothing more is written to ``fileobj``), so an
+        archive of a failed render can't be mistaken for a complete one.
+        """
+        self.output.aborted = True
+        self.tar.close()
+
+    def __enter__(self) -> 'TarWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
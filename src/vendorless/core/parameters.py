@@ -1,13 +1,15 @@
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import warnings
 
 import inspect
 from typing import Any
+import os
 import pathlib
 import rich
-import yaml
-import weakref
+from . import yamlio
+from .context import StackContext, current_context
+import threading
 
 from rich.console import Console
 from rich.prompt import Prompt
@@ -15,35 +17,75 @@ from rich.prompt import Prompt
 console = Console()
 
 
-@dataclass
+@dataclass(slots=True)
 class ParameterReference:
+    # slotted since blueprints can have one per linked parameter
     obj: object
     param: Any
+    generation: int = field(default=-1, init=False, repr=False, compare=False)
+    """The generation ``value`` was cached in (see :class:`Parameter`)."""
+    value: Any = field(default=None, init=False, repr=False, compare=False)
+    """The cached dereferenced value."""
 
     def dereference(self):
         return self.param.__get__(self.obj, self.obj.__class__)
 
-UNRESOLVED = object()
+    def __reduce__(self):
+        # the cached value is only valid in the process that computed it
+        return ParameterReference, (self.obj, self.param)
+
+class _Sentinel:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return self.name
+
+    def __reduce__(self):
+        # pickled by reference so identity checks still work after unpickling
+        return self.name
+
+UNRESOLVED = _Sentinel('UNRESOLVED')
+
+def _lookup_descriptor(owner: type, name: str):
+    return owner.__dict__[name]
+
+def _invalidate_computed_parameters():
+    # computed and linked parameters cache their values per stack context generation (see
+    # StackContext.generation), so an assignment only invalidates the current stack's values
+    current_context().invalidate()
 
 class Parameter:
     def __init__(self, default=UNRESOLVED) -> None:
         self.default = default
 
     def __set_name__(self, owner, name):
+        self.owner = owner
+        self.name = name
         self.attr_name = f'_{name}'
 
+    def __reduce__(self):
+        # pickled by reference (e.g. in a ParameterReference) so it stays the class's descriptor
+        return _lookup_descriptor, (self.owner, self.name)
+
     def __get__(self, instance, owner):
         if instance is None:
             return self
         
-        is_resolved = hasattr(instance, self.attr_name) and not isinstance(instance, ParameterReference)
-
-        if not is_resolved:
+        value = getattr(instance, self.attr_name, UNRESOLVED)
+        if value is UNRESOLVED or isinstance(instance, ParameterReference):
             return ParameterReference(instance, self)
-        
-        value = getattr(instance, self.attr_name)
+
         if isinstance(value, ParameterReference):
-            value = value.dereference()
+            # linked parameters cache their dereferenced value in the reference
+            generation = current_context().generation
+            if value.generation == generation:
+                return value.value
+            resolved = value.dereference()
+            if not isinstance(resolved, ParameterReference):
+                value.generation = generation
+                value.value = resolved
+            return resolved
 
         return value
     
@@ -51,8 +93,9 @@ class Parameter:
         if value is self:
             value = self.default
         
+        _invalidate_computed_parameters()
         if isinstance(value, ConfigurationParameter):
-            value.register_dependant(ParameterReference(instance, self))
+            value.register_dependant(instance, self)
         elif value is not UNRESOLVED:
             setattr(instance, self.attr_name, value)
     
@@ -63,8 +106,24 @@ def parameter(default=UNRESOLVED) -> Any:
     return Parameter(default)
 
 class computed_parameter: # pylint: disable=invalid-name
+    evaluations: int = 0
+    """The number of times any computed parameter's function has been called."""
+    _evaluations_lock = threading.Lock()
+
+    @classmethod
+    def reset_evaluations(cls):
+        with cls._evaluations_lock:
+            computed_parameter.evaluations = 0
+
+    @classmethod
+    def count_evaluation(cls):
+        # parameters are resolved in several threads (e.g. stacks rendered by the same process)
+        with cls._evaluations_lock:
+            computed_parameter.evaluations += 1
+
     def __init__(self, func):
         self.func = func
+        self.name = func.__name__
         self.attr_name = f"_{func.__name__}"
 
         sig = inspect.signature(func)
@@ -75,21 +134,142 @@ class computed_parameter: # pylint: disable=invalid-name
         ]
         assert self.precursors[0] == 'self'
         self.precursors = self.precursors[1:]
+
+    def __set_name__(self, owner, name):
+        self.owner = owner
+
+    def __reduce__(self):
+        return _lookup_descriptor, (self.owner, self.name)
     
     def __get__(self, instance, owner):
         if instance is None:
             return self
+
+        generation = current_context().generation
+        cached = getattr(instance, self.attr_name, None)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+
         args = list(getattr(instance, p) for p in self.precursors)
         if any(isinstance(a, ParameterReference) for a in args):
             return ParameterReference(instance, self)
         value = self.func(instance, *args)
+        computed_parameter.count_evaluation()
+        setattr(instance, self.attr_name, (generation, value))
         return value
 
-INFER=object()
+class ParameterCycleError(ValueError):
+    """Raised when linked or computed parameters depend on themselves."""
+
+class MissingConfigurationError(ValueError):
+    """Raised when a setting isn't configured and can't be prompted for, or a config file doesn't have the selected key path."""
+
+
+def _parameters_of(cls: type) -> dict[str, Parameter | computed_parameter]:
+    # cached on the class itself; a module-level cache would keep classes defined by blueprints
+    # (and, through their globals, the blueprints' objects) alive
+    parameters = cls.__dict__.get('_vendorless_parameters')
+    if parameters is None:
+        parameters = {}
+        for klass in reversed(cls.__mro__):
+            for name, attr in vars(klass).items():
+                if isinstance(attr, (Parameter, computed_parameter)):
+                    parameters[name] = attr
+                else:
+                    parameters.pop(name, None)
+        cls._vendorless_parameters = parameters
+    return parameters
+
+def _dependencies(obj, descriptor) -> list[tuple[object, Parameter | computed_parameter]]:
+    if isinstance(descriptor, Parameter):
+        value = getattr(obj, descriptor.attr_name, UNRESOLVED)
+        if isinstance(value, ParameterReference):
+            return [(value.obj, value.param)]
+        return []
+    parameters = _parameters_of(type(obj))
+    return [(obj, parameters[p]) for p in descriptor.precursors if p in parameters]
+
+def _resolve_node(obj, descriptor, values: dict[tuple[int, int], Any], generation: int):
+    if isinstance(descriptor, Parameter):
+        value = getattr(obj, descriptor.attr_name, UNRESOLVED)
+        if value is UNRESOLVED:
+            return ParameterReference(obj, descriptor)
+        if isinstance(value, ParameterReference):
+            resolved = values[(id(value.obj), id(value.param))]
+            if not isinstance(resolved, ParameterReference):
+                value.generation = generation
+                value.value = resolved
+            return resolved
+        return value
+
+    parameters = _parameters_of(type(obj))
+    args = [
+        values[(id(obj), id(parameters[p]))] if p in parameters else getattr(obj, p)
+        for p in descriptor.precursors
+    ]
+    if any(isinstance(a, ParameterReference) for a in args):
+        return ParameterReference(obj, descriptor)
+    value = descriptor.func(obj, *args)
+    computed_parameter.count_evaluation()
+    setattr(obj, descriptor.attr_name, (generation, value))
+    return value
+
+def resolve_parameters(objects: list[object]):
+    """
+    Resolves the linked and computed parameters of ``objects`` (and everything they link to).
+
+    The parameters form a dependency graph (a linked parameter depends on the parameter it
+    references, and a computed parameter depends on its precursors). The graph is walked once in
+    topological order and every value is cached, so subsequent reads don't follow reference chains.
+    Configuration parameters have already pushed their values to their dependants at this point.
+
+    Raises
+    ------
+    ParameterCycleError
+        If parameters depend on themselves. The message shows the cycle.
+    """
+    generation = current_context().generation
+    indices = {id(obj): i for i, obj in enumerate(objects)}
+
+    def label(obj, descriptor) -> str:
+        return f"{type(obj).__name__}[{indices.get(id(obj), '?')}].{descriptor.name}"
+
+    VISITING, DONE = 1, 2
+    state: dict[tuple[int, int], int] = {}
+    values: dict[tuple[int, int], Any] = {}
+    for root_obj in objects:
+        for root_descriptor in _parameters_of(type(root_obj)).values():
+            root_key = (id(root_obj), id(root_descriptor))
+            if root_key in state:
+                continue
+            state[root_key] = VISITING
+            # iterative depth-first search so long link chains don't hit the recursion limit
+            stack = [(root_obj, root_descriptor, iter(_dependencies(root_obj, root_descriptor)))]
+            while stack:
+                obj, descriptor, dependencies = stack[-1]
+                for dep_obj, dep_descriptor in dependencies:
+                    dep_key = (id(dep_obj), id(dep_descriptor))
+                    dep_state = state.get(dep_key)
+                    if dep_state is None:
+                        state[dep_key] = VISITING
+                        stack.append((dep_obj, dep_descriptor, iter(_dependencies(dep_obj, dep_descriptor))))
+                        break
+                    if dep_state == VISITING:
+                        path = [(o, d) for o, d, _ in stack]
+                        start = next(i for i, (o, d) in enumerate(path) if o is dep_obj and d is dep_descriptor)
+                        cycle = [label(o, d) for o, d in path[start:]] + [label(dep_obj, dep_descriptor)]
+                        raise ParameterCycleError(f"circular parameter dependency: {' -> '.join(cycle)}")
+                else:
+                    stack.pop()
+                    key = (id(obj), id(descriptor))
+                    values[key] = _resolve_node(obj, descriptor, values, generation)
+                    state[key] = DONE
+
+INFER = _Sentinel('INFER')
 
 
 class ConfigurationParameter:
-    _ALL_CONFIGURATION_PARAMETERS: list[weakref.ReferenceType['ConfigurationParameter']] = []
+    __slots__ = ('keys', 'default', 'choices', 'type', '_value', '_dependants', '__weakref__')
 
     @property
     def value(self):
@@ -98,8 +278,10 @@ class ConfigurationParameter:
     @value.setter
     def value(self, value):
         self._value = value
-        for ref in self._connected_parameters:
-            ref.param.__set__(ref.obj, value)
+        _invalidate_computed_parameters()
+        dependants = iter(self._dependants)
+        for param, instance in zip(dependants, dependants):
+            param.__set__(instance, value)
 
     # blueprint parameters should be documented in docs, not a description attribute
 
@@ -108,60 +290,121 @@ class ConfigurationParameter:
         self.default = default
         self.choices = choices
         self.type = type
-        ConfigurationParameter._ALL_CONFIGURATION_PARAMETERS.append(weakref.ref(self))
-        self._connected_parameters: list[ParameterReference] = []
+        self._register()
+        # the linked parameters, flattened to [descriptor, instance, descriptor, instance, ...]
+        # so each one costs two list slots rather than a ParameterReference
+        self._dependants: list = []
         self.value = UNRESOLVED if default is INFER else default
 
+    def _register(self):
+        current_context().add_configuration_parameter(self)
+
     
-    def register_dependant(self, reference: ParameterReference):
-        if self.default is INFER and reference.param.default is not UNRESOLVED:
-            if self.value != UNRESOLVED and self.value != reference.param.default:
+    def register_dependant(self, instance, param: 'Parameter'):
+        if self.default is INFER and param.default is not UNRESOLVED:
+            if self.value != UNRESOLVED and self.value != param.default:
                 warnings.warn(
                     f"Configuration parameter '{self.keys}' is inferring a default value from parameters with different values."
-                    f"Previous default value: {self.value}. New default value: {reference.param.default}."
+                    f"Previous default value: {self.value}. New default value: {param.default}."
                 )
-            self.value = reference.param.default
-        self._connected_parameters.append(reference)
-        reference.param.__set__(reference.obj, self.value)
+            self.value = param.default
+        self._dependants += (param, instance)
+        param.__set__(instance, self.value)
 
 class Configuration:
     INDENT = ' '*4
-
-    def __init__(self, path: pathlib.Path | None, config_selector: str | None) -> 'Configuration':
-        if path is None:
-            self._config = {}
-        else:
+    ENV_PREFIX = 'VENDORLESS_CONFIG__'
+    """Environment variables like ``VENDORLESS_CONFIG__postgres__password`` set ``postgres.password``."""
+
+    def __init__(
+            self,
+            paths: pathlib.Path | list[pathlib.Path] | None,
+            config_selector: str | None,
+            environ: dict[str, str] | None = None,
+        ) -> 'Configuration':
+        """
+        Loads layered configuration sources. Later config files override earlier ones, and
+        environment variables override config files.
+
+        Parameters
+        ----------
+        paths
+            The config files (YAML).
+        config_selector
+            A dotted key path that selects the config within each file.
+        environ
+            The environment variables (``os.environ`` by default).
+
+        Raises
+        ------
+        MissingConfigurationError
+            If a config file doesn't have the ``config_selector`` key path.
+        """
+        if paths is None:
+            paths = []
+        elif isinstance(paths, pathlib.Path):
+            paths = [paths]
+        if environ is None:
+            environ = os.environ
+
+        # flattened key path -> value, and key path -> the source it came from
+        self._values: dict[tuple[str, ...], Any] = {}
+        self._sources: dict[tuple[str, ...], str] = {}
+        # key paths of the mappings that contain settings
+        self._mappings: set[tuple[str, ...]] = set()
+
+        selector = () if config_selector is None else tuple(config_selector.split('.'))
+        for path in paths:
             console.print(f"Loading configuration from [bold]{str(path)}[/bold]")
             with open(path, 'r') as f:
-                self._config = yaml.safe_load(f)
-        
-        if config_selector is not None:
-            self._config = self.get(config_selector)
-    
-    def has(self, keys: tuple[str, ...], *, subset: dict | None = None):
-        s = self._config if subset is None else subset
-        if len(keys) == 1:
-            return keys[0] in s
-        elif keys[0] not in s:
-            return False
-        else:
-            return self.has(keys[1:], subset=s[keys[0]]) 
-    
-    def get(self, keys: tuple[str, ...], *, subset: dict | None = None):
-        s = self._config if subset is None else subset
-        if len(keys) == 1:
-            return s[keys[0]]
-        else:
-            return self.get(keys[1:], subset=s[keys[0]])  
-    
-    def set(self, keys: tuple[str, ...], value, *, subset: dict | None = None):
-        s = self._config if subset is None else subset
-        if len(keys) == 1:
-            s[keys[0]] = value
-        else:
-            if keys[0] not in s:
-                s[keys[0]] = {}
-            self.set(keys[1:], value, subset=s[keys[0]])
+                config = yamlio.load(f)
+            for key in selector:
+                if not isinstance(config, dict) or key not in config:
+                    raise MissingConfigurationError(f"{path} doesn't have '{config_selector}'")
+                config = config[key]
+            if isinstance(config, dict):
+                self._flatten(config, (), str(path))
+
+        for name, value in environ.items():
+            if name.startswith(self.ENV_PREFIX) and len(name) > len(self.ENV_PREFIX):
+                keys = tuple(name[len(self.ENV_PREFIX):].split('__'))
+                self.set(keys, value, f'env:{name}')
+
+    def _flatten(self, config: dict, prefix: tuple[str, ...], source: str):
+        for key, value in config.items():
+            keys = prefix + (key,)
+            if isinstance(value, dict) and value:
+                self._flatten(value, keys, source)
+            else:
+                self.set(keys, value, source)
+
+    def has(self, keys: tuple[str, ...]) -> bool:
+        return keys in self._values or keys in self._mappings
+
+    def get(self, keys: tuple[str, ...]):
+        """The setting at ``keys``, or the mapping of the settings under it."""
+        if keys in self._values or keys not in self._mappings:
+            return self._values[keys]
+        mapping = {}
+        for setting_keys, value in self._values.items():
+            if len(setting_keys) > len(keys) and setting_keys[:len(keys)] == keys:
+                scope = mapping
+                for key in setting_keys[len(keys):-1]:
+                    if not isinstance(scope.get(key), dict):
+                        scope[key] = {}
+                    scope = scope[key]
+                scope[setting_keys[-1]] = value
+        return mapping
+
+    def set(self, keys: tuple[str, ...], value, source: str = 'prompt'):
+        self._values[keys] = value
+        self._sources[keys] = source
+        for i in range(1, len(keys)):
+            self._mappings.add(keys[:i])
+
+    def source(self, keys: tuple[str, ...]) -> str:
+        """The source (config file, environment variable, or prompt) that a setting came from."""
+        return self._sources[keys]
 
     @classmethod
     def print_scope(cls, indent_level: int, key: str):
@@ -196,16 +439,24 @@ class Configuration:
                 console.print(f"[red bold]Error[/bold]: You must enter a {str(configuration_parameter.type)} (invalid entry: '{s}').[/red]")
         return s
 
-    def resolve(self):
-        console.print("Resolving configuration")           
+    def resolve(self, context: StackContext | None = None, interactive: bool = True):
+        """
+        Sets the configuration parameters of the current stack context (or ``context``), prompting
+        for settings that aren't configured.
+
+        Parameters
+        ----------
+        interactive
+            If False, settings that aren't configured use their parameter's default instead of
+            prompting, and :class:`MissingConfigurationError` is raised if there's no default.
+        """
+        if context is None:
+            context = current_context()
+        console.print("Resolving configuration")
         last_level: tuple[str, ...] = ()
         indent = 0
 
-        for configuration_parameter_wr in ConfigurationParameter._ALL_CONFIGURATION_PARAMETERS:
-            configuration_parameter: ConfigurationParameter | None =  configuration_parameter_wr()
-            if configuration_parameter is None:
-                continue
-
+        for configuration_parameter in list(context.configuration_parameters.values()):
             current_level: tuple[str, ...] = configuration_parameter.keys[:-1]
             if current_level != last_level:
                 start_level = next(
@@ -214,6 +465,7 @@ class Configuration:
                 )
                 for i in range(start_level, len(current_level)):
                     self.print_scope(i, current_level[i])
+                last_level = current_level
                 
             indent = len(current_level)
 
@@ -221,6 +473,12 @@ class Configuration:
                 s = self.get(configuration_parameter.keys)
                 s = configuration_parameter.type(s)
                 self.print_setting(indent, configuration_parameter.keys[-1], s)
+            elif not interactive:
+                s = configuration_parameter.value
+                if s is UNRESOLVED:
+                    raise MissingConfigurationError(f"'{'.'.join(configuration_parameter.keys)}' isn't configured")
+                self.print_setting(indent, configuration_parameter.keys[-1], s)
+                self.set(configuration_parameter.keys, s, source='default')
             else:
                 s = self.prompt_setting(indent, configuration_parameter)
                 self.set(configuration_parameter.keys, s)
@@ -228,14 +486,24 @@ class Configuration:
             configuration_parameter.value = s
     
     def dict(self) -> dict:
-        return self._config
+        config = {}
+        for keys, value in self._values.items():
+            scope = config
+            for key in keys[:-1]:
+                if not isinstance(scope.get(key), dict):
+                    scope[key] = {}
+                scope = scope[key]
+            scope[keys[-1]] = value
+        return config
+
+    def sources(self) -> 'dict[str, str]':
+        """Maps each setting's dotted key path to the source it came from."""
+        return {'.'.join(keys): source for keys, source in self._sources.items()}
 
             
 def configuration_parameter(*keys: str, default=INFER, type: type=str, choices: list[str]=None):
-    for c in ConfigurationParameter._ALL_CONFIGURATION_PARAMETERS:
-        c : None | ConfigurationParameter = c()
-        if c is None or c.keys != keys:
-            continue
+    c = current_context().configuration_parameters_by_keys.get(keys)
+    if c is not None:
         return c
     return ConfigurationParameter(*keys, default=default, type=type, choices=choices)
 
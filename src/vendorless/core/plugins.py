@@ -0,0 +1,124 @@
+import hashlib
+import importlib
+import importlib.metadata
+import json
+import os
+import pkgutil
+import sys
+from pathlib import Path
+
+import click
+
+import vendorless
+
+from .utils import cache_dir
+
+ENTRY_POINT_GROUP = 'vendorless.commands'
+"""Entry point group that packages can use to register their ``cli`` group explicitly."""
+
+
+def _index_path() -> Path:
+    # one index per environment (interpreter + prefix)
+    environment = f"{sys.prefix}\0{sys.executable}\0{sys.version}"
+    digest = hashlib.sha1(environment.encode()).hexdigest()[:16]
+    return cache_dir() / f'plugins-{digest}.json'
+
+
+def _fingerprint(paths: list[str]) -> list[tuple[str, int]]:
+    fingerprint = []
+    for path in paths:
+        try:
+            fingerprint.append((path, os.stat(path).st_mtime_ns))
+        except OSError:
+            fingerprint.append((path, -1))
+    return fingerprint
+
+
+def _watched_paths(package_dirs: list[str]) -> list[str]:
+    # Installing or removing a distribution touches a sys.path directory, adding a vendorless
+    # package touches a vendorless namespace directory, and adding a commands module touches
+    # the package's directory. sys.path[0] is the script directory (or cwd) so it isn't watched.
+    paths = [p for p in sys.path[1:] if p and os.path.isdir(p)]
+    paths += list(vendorless.__path__)
+    paths += package_dirs
+    return paths
+
+
+def _scan() -> tuple[dict[str, str], list[str]]:
+    """Find the ``commands`` module of every vendorless package without importing it."""
+    plugins: dict[str, str] = {}
+    package_dirs: list[str] = []
+    for module_info in pkgutil.iter_modules(vendorless.__path__):
+        if not module_info.ispkg:
+            continue
+        spec = module_info.module_finder.find_spec(f'vendorless.{module_info.name}', None)
+        if spec is None or not spec.submodule_search_locations:
+            continue
+        package_dirs.extend(spec.submodule_search_locations)
+        submodules = {m.name for m in pkgutil.iter_modules(spec.submodule_search_locations)}
+        if 'commands' in submodules:
+            plugins[module_info.name] = f'vendorless.{module_info.name}.commands:cli'
+
+    for entry_point in importlib.metadata.entry_points(group=ENTRY_POINT_GROUP):
+        plugins[entry_point.name] = entry_point.value
+    return plugins, package_dirs
+
+
+def plugin_index() -> dict[str, str]:
+    """
+    Maps each package's subcommand name to the ``module:attribute`` of its click group.
+
+    The index is persisted in the cache directory and rebuilt when the environment changes.
+    """
+    index_path = _index_path()
+    try:
+        with open(index_path, 'r') as f:
+            cached = json.load(f)
+        fingerprint = _fingerprint(cached['watched'])
+        if [list(x) for x in fingerprint] == cached['fingerprint']:
+            return cached['plugins']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    plugins, package_dirs = _scan()
+    watched = _watched_paths(package_dirs)
+    try:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = index_path.with_name(f'{index_path.name}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'watched': watched,
+                'fingerprint': _fingerprint(watched),
+                'plugins': plugins,
+            }, f)
+        os.replace(tmp_path, index_path)
+    except OSError:
+        pass  # the cache is an optimization; a read-only home directory is fine
+    return plugins
+
+
+class LazyGroup(click.Group):
+    """
+    A click group whose package subcommands are imported only when they are invoked.
+    """
+
+    def __init__(self, *args, plugins: dict[str, str] | None = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.plugins = plugins if plugins is not None else {}
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted(set(super().list_commands(ctx)) | set(self.plugins))
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> click.Command | None:
+        if cmd_name in self.commands or cmd_name not in self.plugins:
+            return super().get_command(ctx, cmd_name)
+
+        module_name, _, attr = self.plugins[cmd_name].partition(':')
+        try:
+            mod = importlib.import_module(module_name)
+        except ImportError:
+            return None
+        cmd = getattr(mod, attr or 'cli', None)
+        if cmd is not None:
+            self.add_command(cmd, name=cmd_name)
+        return cmd
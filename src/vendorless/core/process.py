@@ -0,0 +1,215 @@
+import asyncio
+import codecs
+import os
+import signal
+import sys
+import time
+from dataclasses import dataclass
+
+from rich.console import Console
+
+console = Console()
+error_console = Console(stderr=True)
+
+CHUNK_SIZE = 64 * 1024
+FLUSH_INTERVAL = 0.05  # seconds between console writes when echoing output
+TAIL_SIZE = 8 * 1024  # bytes of each stream kept for the result's tail
+TERMINATE_GRACE_PERIOD = 5.0  # seconds between SIGTERM and SIGKILL on timeout
+
+
+@dataclass
+class ProcessResult:
+    command: tuple[str, ...]
+    returncode: int
+    """The exit code (negative if the process was killed by a signal)."""
+    duration: float
+    """Wall time in seconds."""
+    timed_out: bool
+    stdout: str | None
+    """The full stdout, if it was captured."""
+    stdout_tail: str
+    """The end of stdout."""
+    stderr_tail: str
+    """The end of stderr."""
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+
+class _StreamReader:
+    def __init__(self, stream: asyncio.StreamReader, echo_console: Console | None, capture: bool) -> None:
+        self.stream = stream
+        self.echo_console = echo_console
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.captured: list[bytes] | None = [] if capture else None
+        self.tail = bytearray()
+        self.pending: list[str] = []
+        self.last_flush = time.perf_counter()
+
+    async def read(self):
+        while True:
+            try:
+                # flush pending output if the command goes quiet
+                chunk = await asyncio.wait_for(self.stream.read(CHUNK_SIZE), FLUSH_INTERVAL if self.pending else None)
+            except asyncio.TimeoutError:
+                self.flush()
+                continue
+            if not chunk:
+                break
+            if self.captured is not None:
+                self.captured.append(chunk)
+            self.tail += chunk
+            del self.tail[:-TAIL_SIZE]
+            if self.echo_console is not None:
+                self.pending.append(self.decoder.decode(chunk))
+                # batch console writes; rendering every line is slow for chatty commands
+                if time.perf_counter() - self.last_flush >= FLUSH_INTERVAL:
+                    self.flush()
+        if self.echo_console is not None:
+            self.pending.append(self.decoder.decode(b'', final=True))
+            self.flush()
+
+    def flush(self):
+        text = ''.join(self.pending)
+        self.pending.clear()
+        self.last_flush = time.perf_counter()
+        if text:
+            self.echo_console.print(text, end='', markup=False, highlight=False, soft_wrap=True)
+
+    def tail_text(self) -> str:
+        return bytes(self.tail).decode('utf-8', errors='replace')
+
+    def captured_text(self) -> str | None:
+        if self.captured is None:
+            return None
+        return b''.join(self.captured).decode('utf-8', errors='replace')
+
+
+def _signal_group(process: asyncio.subprocess.Process, sig: int):
+    try:
+        if sys.platform != 'win32':
+            os.killpg(process.pid, sig)
+        else:
+            process.send_signal(sig)
+    except ProcessLookupError:
+        pass
+
+
+async def run_process(
+        *command: str,
+        input: str | None = None,
+        cwd=None,
+        env=None,
+        timeout: float | None = None,
+        capture: bool = False,
+        echo: bool = False,
+        foreground: bool = False,
+    ) -> ProcessResult:
+    """
+    Runs a command with separate stdout and stderr pipes.
+
+    Parameters
+    ----------
+    input
+        Text written to the command's stdin.
+    timeout
+        Seconds before the command's process group is terminated (SIGTERM, then SIGKILL).
+    capture
+        Keep the full stdout in the result.
+    echo
+        Print stdout and stderr to the console as the command runs.
+    foreground
+        Run the command in this session with the terminal's stdin, stdout, and stderr (e.g.
+        interactive or live commands). Its output isn't captured, and on timeout only the command
+        itself is terminated.
+    """
+    start = time.perf_counter()
+    if foreground:
+        return await _run_foreground(command, cwd, env, timeout, start)
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            env=env,
+            start_new_session=True,  # own process group, so a timeout kills its children too
+        )
+    except OSError as e:
+        return ProcessResult(command, 127, time.perf_counter() - start, False, '' if capture else None, '', str(e))
+
+    stdout = _StreamReader(process.stdout, console if echo else None, capture)
+    stderr = _StreamReader(process.stderr, error_console if echo else None, False)
+    readers = asyncio.gather(stdout.read(), stderr.read())
+
+    if input is not None:
+        try:
+            process.stdin.write(input.encode())
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        process.stdin.close()
+
+    timed_out = False
+    # the process can outlive its pipes (e.g. if it closes them), so the timeout covers both
+    completion = asyncio.gather(readers, process.wait())
+    try:
+        await asyncio.wait_for(asyncio.shield(completion), timeout)
+    except asyncio.CancelledError:
+        # e.g. Ctrl-C; the process group doesn't receive the terminal's SIGINT, so forward it
+        _signal_group(process, signal.SIGINT)
+        raise
+    except asyncio.TimeoutError:
+        timed_out = True
+        _signal_group(process, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), TERMINATE_GRACE_PERIOD)
+        except asyncio.TimeoutError:
+            _signal_group(process, signal.SIGKILL)
+            await process.wait()
+        # grandchildren holding the pipes open were killed with the group
+        await completion
+
+    return ProcessResult(
+        command=command,
+        returncode=process.returncode,
+        duration=time.perf_counter() - start,
+        timed_out=timed_out,
+        stdout=stdout.captured_text(),
+        stdout_tail=stdout.tail_text(),
+        stderr_tail=stderr.tail_text(),
+    )
+
+
+async def _run_foreground(command: tuple[str, ...], cwd, env, timeout: float | None, start: float) -> ProcessResult:
+    try:
+        process = await asyncio.create_subprocess_exec(*command, cwd=cwd, env=env)
+    except OSError as e:
+        return ProcessResult(command, 127, time.perf_counter() - start, False, None, '', str(e))
+
+    timed_out = False
+    try:
+        await asyncio.wait_for(asyncio.shield(process.wait()), timeout)
+    except asyncio.CancelledError:
+        # e.g. Ctrl-C; the command received the terminal's SIGINT too, so let it shut down
+        await process.wait()
+        raise
+    except asyncio.TimeoutError:
+        timed_out = True
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), TERMINATE_GRACE_PERIOD)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+    return ProcessResult(command, process.returncode, time.perf_counter() - start, timed_out, None, '', '')
+
+
+def run(*command: str, **kwargs) -> ProcessResult:
+    """
+    Synchronous :func:`run_process`.
+    """
+    return asyncio.run(run_process(*command, **kwargs))
@@ -0,0 +1,157 @@
+"""
+Timing of render phases, service templates, and files (``vl core render --profile``).
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+
+@dataclass
+class Span:
+    name: str
+    category: str
+    start: float
+    """perf_counter() when the span started."""
+    wall: float
+    cpu: float
+    """CPU time of the thread that ran the span."""
+    thread_id: int
+    args: dict = field(default_factory=dict)
+    pid: int = field(default_factory=os.getpid)
+    """The process that ran the span (e.g. a ``--workers`` process)."""
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+        self.start = time.perf_counter()
+        self.peak_memory: int | None = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, category: str, **args):
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            s = Span(
+                name=name,
+                category=category,
+                start=start,
+                wall=time.perf_counter() - start,
+                cpu=time.thread_time() - cpu_start,
+                thread_id=threading.get_ident(),
+                args=args,
+            )
+            with self._lock:
+                self.spans.append(s)
+
+    def summary(self, console: Console, limit: int = 25):
+        """
+        Prints the phases, then the slowest service templates and files.
+        """
+        totals: dict[tuple[str, str], list[float]] = {}
+        for s in self.spans:
+            total = totals.setdefault((s.category, s.name), [0.0, 0.0, 0])
+            total[0] += s.wall
+            total[1] += s.cpu
+            total[2] += 1
+
+        table = Table(title="Render Profile")
+        table.add_column("Category", justify="left", no_wrap=True)
+        table.add_column("Name", justify="left")
+        table.add_column("Count", justify="right", no_wrap=True)
+        table.add_column("Wall (ms)", justify="right", no_wrap=True)
+        table.add_column("CPU (ms)", justify="right", no_wrap=True)
+
+        phases = [(k, v) for k, v in totals.items() if k[0] == 'phase']
+        others = sorted(
+            ((k, v) for k, v in totals.items() if k[0] != 'phase'),
+            key=lambda kv: kv[1][0],
+            reverse=True,
+        )
+        for (category, name), (wall, cpu, count) in phases + others[:limit]:
+            table.add_row(category, name, str(count), f"{wall * 1000:.1f}", f"{cpu * 1000:.1f}")
+        console.print(table)
+        if self.peak_memory is not None:
+            console.print(f"Peak memory (max RSS): {self.peak_memory / 2**20:.1f} MiB")
+
+    def write_chrome_trace(self, path: Path):
+        """
+        Writes the spans in the Chrome trace event format (chrome://tracing, Perfetto).
+        """
+        events = [
+            {
+                'name': s.name,
+                'cat': s.category,
+                'ph': 'X',
+                'ts': (s.start - self.start) * 1e6,
+                'dur': s.wall * 1e6,
+                'pid': s.pid,
+                'tid': s.thread_id,
+                'args': {'cpu_ms': s.cpu * 1000, **s.args},
+            }
+            for s in self.spans
+        ]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+_profiler: Profiler | None = None
+_disabled = nullcontext()
+
+
+def span(name: str, category: str, **args):
+    """
+    Times a block if profiling is enabled.
+    """
+    if _profiler is None:
+        return _disabled
+    return _profiler.span(name, category, **args)
+
+
+def enabled() -> bool:
+    return _profiler is not None
+
+
+def add_spans(spans: list[Span]):
+    """
+    Adds spans recorded elsewhere (e.g. by a worker process) if profiling is enabled.
+    """
+    if _profiler is not None and spans:
+        with _profiler._lock:
+            _profiler.spans.extend(spans)
+
+
+def _peak_memory() -> int | None:
+    # tracemalloc would be more precise, but it slows rendering down enough to skew the timings
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def enable() -> Profiler:
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def disable() -> Profiler | None:
+    global _profiler
+    profiler = _profiler
+    _profiler = None
+    if profiler is not None:
+        profiler.peak_memory = _peak_memory()
+    return profiler
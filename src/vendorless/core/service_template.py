@@ -1,17 +1,19 @@
 
 
-import yaml
+from . import profiling, yamlio
 import weakref
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from dataclasses import dataclass, is_dataclass, asdict
 
-_service_templates: weakref.WeakValueDictionary[int, 'ServiceTemplate'] = weakref.WeakValueDictionary()
-
 from typing import Generator, Iterator
 from importlib.resources.abc import Traversable
 from pathlib import PurePosixPath, Path
 import importlib.resources
+import functools
+from typing import ClassVar
 
-import jinja2
 
 def get_template_dir_files(template_dir: Traversable, relative_to: PurePosixPath = PurePosixPath("")) -> Generator[str, None, None]:
     for child in template_dir.iterdir():
@@ -21,9 +23,31 @@ def get_template_dir_files(template_dir: Traversable, relative_to: PurePosixPath
         else:
             yield str(rel_path)
 
-from .templating import ResourceLoader
+@functools.cache
+def template_manifest(package: str) -> tuple[str, ...]:
+    """
+    The template files of a vendorless package, relative to ``<package>.templates``.
+
+    The templates package is only traversed once per process.
+    """
+    template_dir = importlib.resources.files(f'{package}.templates')
+    return tuple(sorted(get_template_dir_files(template_dir)))
+
+_class_template_lists: weakref.WeakKeyDictionary[type, tuple[tuple[str, str], ...]] = weakref.WeakKeyDictionary()
+
+from .context import StackContext, current_context
+from .output import StackWriter
+from .parameters import computed_parameter, resolve_parameters, _parameters_of
+from .templating import get_environment, render_path, template_package
 
 class ServiceTemplate:
+    template_dir: ClassVar[str | None] = None
+    """
+    The directory (within the package's templates) that the service template renders. Its files
+    are rendered relative to the stack's root. If None, the service template renders all of the
+    package's templates, except directories with a ``cookiecutter.json``.
+    """
+
     def __init__(self) -> None:
         self._assert_is_dataclass()
     
@@ -33,28 +57,59 @@ class ServiceTemplate:
 
     def __post_init__(self):
         self._assert_is_dataclass()
-        _service_templates[id(self)] = self
+        self._register()
+
+    def _register(self):
+        current_context().add_service_template(self)
+
+    def __getstate__(self):
+        # computed values are only valid in the process that computed them (linked parameters'
+        # cached values are dropped when their ParameterReference is pickled)
+        state = self.__dict__.copy()
+        for descriptor in _parameters_of(self.__class__).values():
+            if isinstance(descriptor, computed_parameter):
+                state.pop(descriptor.attr_name, None)
+        return state
 
     def _copy_list(self) -> list[tuple[str, str]]:
         return []
     
     def _template_list(self) -> list[tuple[str, str]]:
-        vl_module = self.__class__.__module__
-        assert vl_module.startswith('vendorless.')
-        assert len(vl_module.split('.')) >= 2
+        cls = self.__class__
+        files = _class_template_lists.get(cls)
+        if files is None:
+            package = template_package(self)
+            manifest = template_manifest(package)
+            if cls.template_dir is not None:
+                prefix = f"{cls.template_dir.strip('/')}/"
+                files = tuple((f, f[len(prefix):]) for f in manifest if f.startswith(prefix))
+            else:
+                # cookiecutter templates (e.g. vendorless.core's package template) aren't stack files
+                skipped = tuple(f.removesuffix('cookiecutter.json') for f in manifest if f.rpartition('/')[2] == 'cookiecutter.json')
+                files = tuple((f, f) for f in manifest if not f.startswith(skipped))
+            _class_template_lists[cls] = files
+        return list(files)
+    
+    def _docker_compose(self) -> dict | None:
+        """
+        The service template's docker-compose fragment as data (e.g. ``{'services': {...}}``).
 
-        template_dir = importlib.resources.files(f'{".".join(vl_module.split(".")[:2])}.templates')
-        files = []
-        for template_file in get_template_dir_files(template_dir):
-            files.append((template_file, template_file))
-        return files
+        Override this to contribute the fragment directly instead of rendering and parsing a
+        docker-compose.yaml template. Returns None by default, in which case docker-compose.yaml
+        templates are rendered.
+        """
+        return None
     
-    def _render(self, docker_compose: dict):
-        loader = ResourceLoader(self)
-        env = jinja2.Environment(
-            loader=loader
-        )
-        context = asdict(self)
+    def _render(self) -> tuple[list[tuple[Path, str | Traversable]], list[dict]]:
+        """
+        Renders the service template's files.
+
+        Returns the files to write (rendered text, or the resource to copy) and the
+        docker-compose fragments to merge into the stack's docker-compose.yaml.
+        """
+        compose_fragment = self._docker_compose()
+        files = []
+        compose_fragments = [] if compose_fragment is None else [compose_fragment]
 
         dsts = {}
         copies = set()
@@ -68,40 +123,112 @@ class ServiceTemplate:
                 raise ValueError(f"multiple input files render '{dst}'")
             dsts[dst] = src
             copies.add(dst)
+
+        if not dsts:
+            return files, compose_fragments
+
+        package = template_package(self)
+        env = get_environment(package)
+        context = asdict(self)
         stack_root = Path('.')
-        for dst, src in dsts.items():
-            dst = stack_root / env.from_string(dst).render(context)
-            dst.parent.mkdir(parents=True, exist_ok=True)
-            if dst in copies:
-                with open(dst, 'wb') as f:
-                    f.write((loader.files / src).read_bytes())  # TODO: test
-            else:
+        for dst_template, src in dsts.items():
+            dst = stack_root / render_path(package, dst_template, context)
+            if dst.name == 'docker-compose.yaml' and compose_fragment is not None:
+                continue
+            if dst_template in copies:
+                files.append((dst, env.loader.files / src))
+                continue
+            with profiling.span(src, 'template file', package=package):
                 template = env.get_template(src)
                 rendered = template.render(context)
                 if dst.name == 'docker-compose.yaml':
-                    
-                    dc_data: dict = yaml.safe_load(rendered)
-                    kv: dict
-                    for first_key, kv in dc_data.items():
-                        if first_key not in docker_compose:
-                            docker_compose[first_key] = {}
-                        
-                        for second_key, v in kv.items():
-                            if second_key in docker_compose[first_key]:
-                                raise ValueError(f'multiple service templates render {first_key}.{second_key} ')
-                            docker_compose[first_key][second_key] = v
+                    compose_fragments.append(yamlio.load(rendered))
                 else:
-                    with open(dst, 'w') as f:
-                        f.write(rendered)
+                    files.append((dst, rendered))
+        return files, compose_fragments
 
+    @staticmethod
+    def _merge_compose(docker_compose: dict, dc_data: dict):
+        kv: dict
+        for first_key, kv in dc_data.items():
+            if first_key not in docker_compose:
+                docker_compose[first_key] = {}
+            
+            for second_key, v in kv.items():
+                if second_key in docker_compose[first_key]:
+                    raise ValueError(f'multiple service templates render {first_key}.{second_key} ')
+                docker_compose[first_key][second_key] = v
 
     @classmethod
-    def render_stack(cls):
+    def render_stack(cls, workers: int = 1, writer: StackWriter | None = None, context: StackContext | None = None):
+        """
+        Renders every service template in the current stack context (or ``context``) to the
+        current directory (or ``writer``).
+
+        With ``workers > 1`` templates are rendered concurrently in a pool of worker processes
+        (see ``benchmarks/bench_workers.py``). Files are written and docker-compose fragments are
+        merged in registration order either way, so the output is identical to a serial render.
+        Service templates that can't be pickled (e.g. of classes defined by the blueprint) are
+        rendered in this process.
+        """
+        if writer is None:
+            writer = StackWriter(Path('.'))
+        if context is None:
+            context = current_context()
+        service_templates = list(context.service_templates.values())
+        with profiling.span('resolve parameters', 'phase'):
+            resolve_parameters(service_templates)
+
         docker_compose = {}
-        for service_template in _service_templates.values():
-            service_template._render(docker_compose)
-        with open('docker-compose.yaml', 'w') as f:
-            yaml.safe_dump(docker_compose, f)
+        with (
+            profiling.span('render templates', 'phase'),
+            ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(service_templates) > 1 else nullcontext() as executor,
+        ):
+            if executor is None:
+                outputs = map(_render_service_template, service_templates)
+            else:
+                outputs = _render_in_workers(executor, service_templates)
+
+            for files, compose_fragments in outputs:
+                for dst, content in files:
+                    with profiling.span(dst.as_posix(), 'write'):
+                        writer.write(dst.as_posix(), content)
+                for dc_data in compose_fragments:
+                    cls._merge_compose(docker_compose, dc_data)
+
+        with profiling.span('write docker-compose.yaml', 'phase'), writer.open('docker-compose.yaml') as f:
+            yamlio.dump(docker_compose, f)
+
+
+def _render_service_template(service_template: ServiceTemplate):
+    with profiling.span(service_template.__class__.__name__, 'service template'):
+        return service_template._render()
+
+
+def _render_in_worker(service_template: ServiceTemplate, profile: bool):
+    # the spans are returned to the parent's profiler
+    profiler = profiling.enable() if profile else None
+    try:
+        return _render_service_template(service_template), profiler.spans if profiler else []
+    finally:
+        if profile:
+            profiling.disable()
+
+
+def _render_in_workers(executor: ProcessPoolExecutor, service_templates: list[ServiceTemplate]):
+    """
+    Renders service templates in worker processes, yielding their outputs in submission order.
+    """
+    profile = profiling.enabled()
+    futures = [executor.submit(_render_in_worker, service_template, profile) for service_template in service_templates]
+    for service_template, future in zip(service_templates, futures):
+        try:
+            output, spans = future.result()
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # the service template (or what it renders) can't be sent between processes
+            output, spans = _render_service_template(service_template), []
+        profiling.add_spans(spans)
+        yield output
 
 @dataclass
 class _DummyServiceTemplates(ServiceTemplate):
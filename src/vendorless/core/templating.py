@@ -1,19 +1,94 @@
-import importlib.resources as resources
-from jinja2 import Environment, BaseLoader, TemplateNotFound
 import importlib.resources
+import os
+from pathlib import Path
+
+from jinja2 import BaseLoader, Environment, FileSystemBytecodeCache, Template, TemplateNotFound
+
+
+def template_package(obj) -> str:
+    """
+    The vendorless package (e.g. ``vendorless.core``) that provides the templates for ``obj``'s class.
+    """
+    vl_module = obj.__class__.__module__ if not isinstance(obj, type) else obj.__module__
+    assert vl_module.startswith('vendorless.')
+    assert len(vl_module.split('.')) >= 2
+    return ".".join(vl_module.split(".")[:2])
+
 
 class ResourceLoader(BaseLoader):
-    def __init__(self, obj):
-        vl_module = obj.__class__.__module__
-        assert vl_module.startswith('vendorless.')
-        assert len(vl_module.split('.')) >= 2
-        self.files = importlib.resources.files(f'{".".join(vl_module.split(".")[:2])}.templates')
+    def __init__(self, package: str):
+        self.files = importlib.resources.files(f'{package}.templates')
 
     def get_source(self, environment, template):
-        # resource_path = f"{self.folder}/{template}"
+        resource = self.files / template
         try:
-            contents = (self.files / template).read_text()
+            contents = resource.read_text()
         except FileNotFoundError:
             raise TemplateNotFound(template)
 
-        return contents, str(template), lambda: True
\ No newline at end of file
+        if isinstance(resource, Path):
+            # templates on the filesystem may be edited (e.g. editable installs)
+            filename = str(resource)
+            try:
+                mtime = os.path.getmtime(filename)
+            except OSError:
+                mtime = None
+
+            def uptodate() -> bool:
+                try:
+                    return os.path.getmtime(filename) == mtime
+                except OSError:
+                    return False
+
+            return contents, filename, uptodate
+
+        # resources in archives can't change during the lifetime of the process
+        return contents, str(template), lambda: True
+
+
+_environments: dict[str, Environment] = {}
+_path_templates: dict[tuple[str, str], Template] = {}
+_bytecode_cache: FileSystemBytecodeCache | None = None
+
+
+def get_environment(package: str) -> Environment:
+    """
+    The Jinja environment for a vendorless package's templates.
+
+    Environments are shared for the lifetime of the process so each template is compiled once.
+    """
+    env = _environments.get(package)
+    if env is None:
+        env = Environment(
+            loader=ResourceLoader(package),
+            cache_size=-1,
+            bytecode_cache=_bytecode_cache,
+        )
+        _environments[package] = env
+    return env
+
+
+def render_path(package: str, path: str, context: dict) -> str:
+    """
+    Renders a destination path, which may contain Jinja expressions.
+    """
+    if '{' not in path:
+        return path
+    template = _path_templates.get((package, path))
+    if template is None:
+        template = get_environment(package).from_string(path)
+        _path_templates[(package, path)] = template
+    return template.render(context)
+
+
+def enable_bytecode_cache(directory: Path):
+    """
+    Persists compiled templates in ``directory``.
+
+    Cached bytecode is only reused if the template's source is unchanged.
+    """
+    global _bytecode_cache
+    directory.mkdir(parents=True, exist_ok=True)
+    _bytecode_cache = FileSystemBytecodeCache(str(directory))
+    for env in _environments.values():
+        env.bytecode_cache = _bytecode_cache
@@ -3,8 +3,7 @@ from click.testing import CliRunner, Result
 from rich.prompt import Prompt
 from vendorless.core.cli import main
 import os
-import yaml
-import time
+from vendorless.core import yamlio
 
 import subprocess
 from typing import Callable, Generator, Iterator
@@ -65,10 +64,10 @@ class Tester:
     
     def write_yaml(self, data: dict, file_path: str):
         with open(file_path ,'w') as f:
-            yaml.safe_dump(data, f)
+            yamlio.dump(data, f)
     
     @contextmanager
-    def run_stack(self, blueprint: str, config: dict):
+    def run_stack(self, blueprint: str, config: dict, timeout: float = 600):
         self.write_yaml(config, 'config.yaml')
         self.run_cli([
             'core',
@@ -83,11 +82,8 @@ class Tester:
             'test_stack',
         ])
         
-        while status := self.run_cli(['core', 'status', 'test_stack'], return_exit_code=True):
-            if status != 0:
-                break
-            time.sleep(0.1)
-        
+        status = self.run_cli(['core', 'wait', 'test_stack', '--timeout', str(timeout)], return_exit_code=True)
+        assert status != 1, f"The test stack didn't start within {timeout}s"
         assert status == 0, "The test stack failed to start properly"
         yield
         self.run_cli([
@@ -99,7 +95,6 @@ class Tester:
 
     
     # start docker
-    # wait for healthy (with timeout)
     # run tests...
     # clean up all docker resources
 
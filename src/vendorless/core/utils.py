@@ -1,5 +1,6 @@
 import os
 from contextlib import contextmanager
+from pathlib import Path
 
 @contextmanager
 def change_cwd(new_cwd):
@@ -8,4 +9,14 @@ def change_cwd(new_cwd):
         os.chdir(new_cwd)
         yield
     finally:
-        os.chdir(prev_dir)
\ No newline at end of file
+        os.chdir(prev_dir)
+
+def cache_dir() -> Path:
+    """
+    Directory for vendorless caches: ``$VENDORLESS_CACHE_DIR``, else
+    ``$XDG_CACHE_HOME/vendorless``, else ``~/.cache/vendorless``.
+    """
+    if 'VENDORLESS_CACHE_DIR' in os.environ:
+        return Path(os.environ['VENDORLESS_CACHE_DIR'])
+    xdg_cache_home = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(xdg_cache_home) / 'vendorless'
@@ -13,6 +13,7 @@ class Volume(ServiceTemplate):
     """The name of the Docker volume."""
 
     def _template_list(self) -> list[tuple[str, str]]:
-        return [
-            ('volume/docker-compose.yaml', 'docker-compose.yaml')
-        ]
\ No newline at end of file
+        return []
+
+    def _docker_compose(self) -> dict:
+        return {'volumes': {self.name: None}}
@@ -0,0 +1,26 @@
+"""
+YAML loading and dumping.
+
+Uses PyYAML's libyaml bindings (``CSafeLoader``/``CSafeDumper``) when they are available and
+falls back to the pure-Python ``SafeLoader``/``SafeDumper`` otherwise.
+"""
+from typing import IO, Any
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+    LIBYAML = True
+except ImportError:  # PyYAML was built without libyaml
+    from yaml import SafeLoader, SafeDumper
+    LIBYAML = False
+
+
+def load(stream: str | bytes | IO) -> Any:
+    """Equivalent to ``yaml.safe_load``."""
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def dump(data: Any, stream: IO | None = None, **kwargs) -> str | None:
+    """Equivalent to ``yaml.safe_dump``."""
+    return yaml.dump(data, stream, Dumper=SafeDumper, **kwargs)
@@ -0,0 +1,51 @@
+import importlib.metadata
+import runpy
+
+from vendorless.core import blueprint_cache
+from vendorless.core.context import StackContext
+
+BLUEPRINT = """
+from vendorless.core import Volume
+from vendorless.core.parameters import configuration_parameter
+
+name = configuration_parameter("volume", "name")
+data = Volume(name="data")
+configured = Volume()
+configured.name = name
+"""
+
+
+def test_blueprint_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('VENDORLESS_CACHE_DIR', str(tmp_path / 'cache'))
+    blueprint = tmp_path / 'blueprint.py'
+    blueprint.write_text(BLUEPRINT)
+    source = blueprint_cache.blueprint_source(str(blueprint))
+    cache_path = blueprint_cache.cache_path(source)
+    assert cache_path.parent == tmp_path / 'cache' / 'blueprints'
+
+    with StackContext():
+        results = runpy.run_path(str(blueprint))
+        data = blueprint_cache.capture(source, {'vendorless.core': importlib.metadata.version('vendorless.core')})
+    blueprint_cache.save(cache_path, data)
+    del results
+    assert cache_path.stat().st_mode & 0o777 == 0o600
+
+    with StackContext() as context:
+        evaluated = blueprint_cache.load(cache_path, source)
+    assert evaluated is not None
+    assert list(context.service_templates.values()) == evaluated.service_templates
+    data, configured = evaluated.service_templates
+    assert data.name == "data"
+
+    name = context.configuration_parameters_by_keys[("volume", "name")]
+    name.value = "configured"
+    assert configured.name == "configured"
+
+    # not loaded if another user could have written it
+    cache_path.chmod(0o666)
+    assert blueprint_cache.load(cache_path, source) is None
+    cache_path.chmod(0o600)
+
+    # stale once the blueprint changes
+    blueprint.write_text(BLUEPRINT + "\n# changed\n")
+    assert blueprint_cache.load(cache_path, source) is None
@@ -0,0 +1,299 @@
+import os
+import stat
+import tarfile
+import time
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from vendorless.core.cli import main
+
+# A fake docker CLI: stacks named "failing*" fail to start, and their service is unhealthy.
+# The service of "healthy*", "dying*", and "hanging*" stacks is starting; it becomes healthy
+# (after a container that was replaced before the wait dies), dies, or never changes. "empty*"
+# stacks have no containers.
+FAKE_DOCKER = """#!/bin/sh
+stack=$(basename "$PWD")
+event() {
+    echo '{"Type":"container","Action":"'"$1"'","Actor":{"ID":"'"${3:-12345678abcdef}"'","Attributes":{"com.docker.compose.service":"web"'"$2"'}}}'
+}
+case "$1 $2" in
+    "compose up"|"compose down")
+        case "$stack" in failing*) echo "error: $stack" >&2; exit 1;; esac
+        ;;
+    "compose ps")
+        case "$stack" in empty*) ;; *) echo "id-$stack";; esac
+        ;;
+    "compose config")
+        echo '{"name": "'"$stack"'"}'
+        ;;
+    inspect*)
+        case "$stack" in
+            failing*) echo "web,12345678,running,unhealthy,0";;
+            healthy*|dying*|hanging*) echo "web,12345678,running,starting,0";;
+            *) echo "web,12345678,running,healthy,0";;
+        esac
+        ;;
+    events*)
+        sleep 0.2
+        case "$stack" in
+            healthy*) event "die" ',"exitCode":"143"' 87654321abcdef; event "exec_start: sh -c true"; event "health_status: healthy";;
+            dying*) event "die" ',"exitCode":"3"';;
+        esac
+        exec sleep 30
+        ;;
+esac
+"""
+
+
+def make_stacks(tmp_path: Path, monkeypatch, names: list[str]):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    docker = bin_dir / 'docker'
+    docker.write_text(FAKE_DOCKER)
+    docker.chmod(docker.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    for name in names:
+        (tmp_path / 'stacks' / name).mkdir(parents=True)
+        (tmp_path / 'stacks' / name / 'docker-compose.yaml').write_text('services: {}\n')
+    monkeypatch.chdir(tmp_path)
+
+
+def test_fleet_status(tmp_path, monkeypatch):
+    make_stacks(tmp_path, monkeypatch, ['a', 'b', 'c'])
+    result = CliRunner().invoke(main, ['core', 'status', 'stacks/*', '-j', '2'])
+    assert result.exit_code == 0, result.output
+    for name in ['a', 'b', 'c']:
+        assert os.path.join('stacks', name) in result.output
+
+    (tmp_path / 'stacks' / 'failing').mkdir()
+    (tmp_path / 'stacks' / 'failing' / 'docker-compose.yaml').write_text('services: {}\n')
+    result = CliRunner().invoke(main, ['core', 'status', 'stacks/*'])
+    assert result.exit_code == 2
+    assert 'unhealthy' in result.output
+
+
+def test_fleet_start(tmp_path, monkeypatch):
+    make_stacks(tmp_path, monkeypatch, ['a', 'failing'])
+    result = CliRunner().invoke(main, ['core', 'start', 'stacks/a'])
+    assert result.exit_code == 0, result.output
+    result = CliRunner().invoke(main, ['core', 'start', 'stacks/*'])
+    assert result.exit_code == 1
+    assert 'error: failing' in result.output
+
+
+def test_wait(tmp_path, monkeypatch):
+    make_stacks(tmp_path, monkeypatch, ['a', 'healthy', 'dying', 'hanging', 'empty'])
+
+    def wait(*args):
+        start = time.monotonic()
+        result = CliRunner().invoke(main, ['core', 'wait', *args])
+        return result, time.monotonic() - start
+
+    result, duration = wait('stacks/a', 'stacks/healthy')
+    assert result.exit_code == 0, result.output
+    assert 'healthy' in result.output
+    assert duration < 5
+
+    result, duration = wait('stacks/dying', '--timeout', '10')
+    assert result.exit_code == 2
+    assert 'exited (3)' in result.output
+    assert duration < 5
+
+    result, _ = wait('stacks/hanging', '--timeout', '0.5')
+    assert result.exit_code == 1
+    assert 'timed out' in result.output
+
+    result, _ = wait('stacks/hanging', '--timeout', '10', '-s', 'web=0.5')
+    assert result.exit_code == 1
+    assert 'timed out' in result.output
+
+    result, duration = wait('stacks/empty')
+    assert result.exit_code == 2
+    assert 'not running' in result.output
+    assert duration < 5
+
+    for service_timeout, message in [('web', 'SERVICE=SECONDS'), ('=5', "doesn't name a service"), ('web=-1', 'at least 0')]:
+        result, _ = wait('stacks/a', '-s', service_timeout)
+        assert result.exit_code == 2
+        assert message in result.output
+
+
+CHECK_BLUEPRINT = """
+from vendorless.core import Volume
+from vendorless.core.parameters import configuration_parameter
+
+name = configuration_parameter("volume", "name")
+volume = Volume()
+volume.name = name
+"""
+
+
+def test_render_check(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'blueprint.py').write_text(CHECK_BLUEPRINT)
+    (tmp_path / 'config.yaml').write_text("volume:\n  name: data\n")
+
+    def check(*args):
+        return CliRunner().invoke(main, ['core', 'render', 'blueprint.py', '--check', *args])
+
+    assert check().output == "stale: there's no lock file\n"
+    result = CliRunner().invoke(main, ['core', 'render', 'blueprint.py', '-c', 'config.yaml', '-y'])
+    assert result.exit_code == 0, result.output
+
+    result = check('-c', 'config.yaml')
+    assert (result.exit_code, result.output) == (0, "up to date\n")
+    assert check().output == "up to date\n"  # the lock file's configuration is reused
+
+    (tmp_path / 'other.yaml').write_text("volume:\n  name: other\n")
+    result = check('-c', 'other.yaml')
+    assert (result.exit_code, result.output) == (1, "stale: setting volume.name changed\n")
+    monkeypatch.setenv('VENDORLESS_CONFIG__volume__name', 'env')
+    assert check().output == "stale: setting volume.name changed\n"
+    monkeypatch.delenv('VENDORLESS_CONFIG__volume__name')
+
+    (tmp_path / 'blueprint' / 'docker-compose.yaml').write_text("volumes: {}\n")
+    assert check().output == "stale: docker-compose.yaml was modified\n"
+
+    (tmp_path / 'blueprint.py').write_text(CHECK_BLUEPRINT + "\n# changed\n")
+    assert check().output == "stale: the blueprint changed\n"
+
+
+def test_render_reloads_lock_configuration(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'blueprint.py').write_text(CHECK_BLUEPRINT)
+    (tmp_path / 'config.yaml').write_text("volume:\n  name: data\n")
+    result = CliRunner().invoke(main, ['core', 'render', 'blueprint.py', '-c', 'config.yaml', '-y'])
+    assert result.exit_code == 0, result.output
+
+    # the stack's configuration is loaded from its lock file, so nothing is prompted for
+    result = CliRunner().invoke(main, ['core', 'render', 'blueprint.py', '-y'], input='')
+    assert result.exit_code == 0, result.output
+    assert "volume:\n    name: data\n" in result.output
+    assert "1 unchanged" in result.output  # docker-compose.yaml
+
+
+def test_render_archive_failure(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'blueprint.py').write_text(CHECK_BLUEPRINT)
+
+    # the setting isn't configured, and can't be prompted for
+    result = CliRunner().invoke(main, ['core', 'render', 'blueprint.py', '-y', '--archive', 'stack.tar.gz'], input='')
+    assert result.exit_code != 0
+    assert not (tmp_path / 'stack.tar.gz').exists()
+
+    (tmp_path / 'config.yaml').write_text("volume:\n  name: data\n")
+    result = CliRunner().invoke(main, ['core', 'render', 'blueprint.py', '-c', 'config.yaml', '-y', '--archive', 'stack.tar.gz'])
+    assert result.exit_code == 0, result.output
+    with tarfile.open(tmp_path / 'stack.tar.gz') as tar:
+        assert 'vendorless-lock.yaml' in tar.getnames()
+
+
+def test_render_check_does_not_import_jinja(tmp_path):
+    import subprocess
+    import sys
+
+    # a module blueprint in a package whose __init__ imports Jinja
+    package = tmp_path / 'vendorless' / 'checkdemo'
+    (package / 'blueprints').mkdir(parents=True)
+    (package / '__init__.py').write_text("import jinja2\n")
+    (package / 'blueprints' / '__init__.py').write_text("import jinja2\n")
+    (package / 'blueprints' / 'site.py').write_text("import jinja2\n")
+    # a lock file, so --check looks up the blueprint's source
+    for stack, blueprint in [('blueprint', tmp_path / 'blueprint.py'), ('vendorless.checkdemo.blueprints.site', 'vendorless.checkdemo.blueprints.site')]:
+        (tmp_path / stack).mkdir()
+        (tmp_path / stack / 'vendorless-lock.yaml').write_text(f"blueprint: {blueprint}\nfingerprints:\n  blueprint: outdated\n")
+
+    for blueprint in ['blueprint.py', 'vendorless.checkdemo.blueprints.site']:
+        code = (
+            "import sys; from vendorless.core.cli import main; "
+            "from click.testing import CliRunner; "
+            f"result = CliRunner().invoke(main, ['core', 'render', '{blueprint}', '--check']); "
+            "print(result.output.strip()); "
+            "print('jinja2' in sys.modules, 'cookiecutter' in sys.modules)"
+        )
+        env = {**os.environ, 'PYTHONPATH': os.pathsep.join([str(tmp_path), *sys.path])}
+        result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=env, capture_output=True, text=True, check=True)
+        assert result.stdout.splitlines() == ["stale: the blueprint changed", "False False"], blueprint
+
+
+def write_wheel(directory: Path, name: str, version: str) -> Path:
+    import zipfile
+
+    module = name.replace('-', '_')
+    dist_info = f'{module}-{version}.dist-info'
+    files = {
+        f'{module}/__init__.py': "VALUE = 1\n",
+        f'{dist_info}/METADATA': f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n",
+        f'{dist_info}/WHEEL': "Wheel-Version: 1.0\nGenerator: test\nRoot-Is-Purelib: true\nTag: py3-none-any\n",
+    }
+    files[f'{dist_info}/RECORD'] = ''.join(f'{path},,\n' for path in [*files, f'{dist_info}/RECORD'])
+    wheel = directory / f'{module}-{version}-py3-none-any.whl'
+    with zipfile.ZipFile(wheel, 'w') as f:
+        for path, content in files.items():
+            f.writestr(path, content)
+    return wheel
+
+
+def test_package_bundle(tmp_path):
+    import subprocess
+    import sys
+
+    from vendorless.core.bundle import read_manifest
+
+    wheel = write_wheel(tmp_path, 'bundled-example', '1.2.3')
+    output = tmp_path / 'bundle'
+    for _ in range(2):  # the second build replaces the first
+        result = CliRunner().invoke(main, ['core', 'package', 'bundle', str(wheel), '-o', str(output), '--pip-arg=--no-index'])
+        assert result.exit_code == 0, result.output
+
+    manifest = read_manifest(output)
+    assert manifest['packages'] == [str(wheel)]
+    assert manifest['distributions'] == {'bundled-example': '1.2.3'}
+    assert manifest['python'] == '%d.%d' % sys.version_info[:2]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['bundle', wheel.name]
+
+    value = subprocess.run(
+        [sys.executable, '-c', 'import bundled_example; print(bundled_example.VALUE)'],
+        env={**os.environ, 'PYTHONPATH': str(output / 'site')}, capture_output=True, text=True, check=True,
+    )
+    assert value.stdout == "1\n"
+
+    result = CliRunner().invoke(main, ['core', 'package', 'bundle', 'does-not-exist', '-o', str(output), '--pip-arg=--no-index'])
+    assert result.exit_code == 1
+    assert read_manifest(output) == manifest
+
+
+def docs_page(*commands: str) -> str:
+    return "# Page\n\n```console\n" + ''.join(f"$ {command}\n" for command in commands) + "output\n```\n"
+
+
+def test_docs_run(tmp_path, monkeypatch):
+    monkeypatch.setenv('VENDORLESS_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.chdir(tmp_path)
+    docs = Path('docs')
+    (docs / 'tutorials').mkdir(parents=True)
+    (docs / 'a.md').write_text(docs_page("test ! -e shared", "touch shared", "test -e shared"))
+    (docs / 'tutorials' / 'b.md').write_text(docs_page("test ! -e shared", "touch shared"))
+    (docs / 'c.md').write_text(docs_page("exit 3"))
+    (docs / 'd.md').write_text(docs_page("sleep 10"))
+
+    def docs_run(*args):
+        return CliRunner().invoke(main, ['core', 'package', 'docs-run', *args, '-j', '4', '--timeout', '1'])
+
+    # pages run in separate directories
+    result = docs_run(str(docs))
+    assert result.exit_code == 3
+    lines = [line for line in result.output.splitlines() if '.md' in line and '│' in line]
+    assert [[cell.strip() for cell in line.split('│')[1:3]] for line in lines] == [
+        [str(docs / name), code] for name, code in [
+            ('a.md', '0'), ('c.md', '3'), ('d.md', 'timed out'), ('tutorials/b.md', '0'),
+        ]
+    ]
+
+    # c.md runs in a sandbox even though a.md is skipped
+    (docs / 'c.md').write_text(docs_page("test ! -e docs"))
+    result = docs_run(str(docs / 'a.md'), str(docs / 'c.md'), '--changed-only')
+    assert "Skipped 1 unchanged page that passed" in result.output
+    assert str(docs / 'a.md') not in result.output
+    assert result.exit_code == 0
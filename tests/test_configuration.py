@@ -0,0 +1,60 @@
+import yaml
+
+from vendorless.core.parameters import Configuration
+
+
+def write_yaml(path, data):
+    with open(path, 'w') as f:
+        yaml.safe_dump(data, f)
+    return path
+
+
+def test_layered_configuration(tmp_path):
+    base = write_yaml(tmp_path / 'base.yaml', {
+        'prod': {'db': {'host': 'db', 'port': 5432}, 'name': 'app'},
+        'dev': {'db': {'host': 'localhost'}},
+    })
+    override = write_yaml(tmp_path / 'override.yaml', {
+        'prod': {'db': {'port': 6543}},
+    })
+    environ = {
+        'VENDORLESS_CONFIG__name': 'from-env',
+        'UNRELATED': 'x',
+    }
+
+    configuration = Configuration([base, override], 'prod', environ=environ)
+    assert configuration.get(('db', 'host')) == 'db'
+    assert configuration.get(('db', 'port')) == 6543
+    assert configuration.get(('name',)) == 'from-env'
+    # mappings can be looked up too (e.g. for parameters whose values are mappings)
+    assert configuration.has(('db',))
+    assert configuration.get(('db',)) == {'host': 'db', 'port': 6543}
+    assert not configuration.has(('dev', 'db', 'host'))
+
+    configuration.set(('db', 'password'), 'secret')
+    assert configuration.dict() == {
+        'db': {'host': 'db', 'port': 6543, 'password': 'secret'},
+        'name': 'from-env',
+    }
+    assert configuration.sources() == {
+        'db.host': str(base),
+        'db.port': str(override),
+        'db.password': 'prompt',
+        'name': 'env:VENDORLESS_CONFIG__name',
+    }
+
+
+def test_configuration_selector_key_path(tmp_path):
+    path = write_yaml(tmp_path / 'config.yaml', {'envs': {'dev': {'host': 'localhost'}}})
+    configuration = Configuration(path, 'envs.dev', environ={})
+    assert configuration.dict() == {'host': 'localhost'}
+
+
+def test_configuration_selector_missing(tmp_path):
+    import pytest
+
+    from vendorless.core.parameters import MissingConfigurationError
+
+    path = write_yaml(tmp_path / 'config.yaml', {'envs': {'dev': {'host': 'localhost'}}})
+    with pytest.raises(MissingConfigurationError, match='envs.prod'):
+        Configuration(path, 'envs.prod', environ={})
@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from vendorless.core import Volume
+from vendorless.core.context import StackContext, current_context
+from vendorless.core.output import StackWriter
+from vendorless.core.parameters import Configuration, configuration_parameter
+from vendorless.core.service_template import ServiceTemplate
+
+
+def render(output, name: str) -> str:
+    output.mkdir()
+    with StackContext() as context:
+        volume = Volume()
+        name_parameter = configuration_parameter("volume", "name")
+        volume.name = name_parameter
+        Configuration(None, None, environ={'VENDORLESS_CONFIG__volume__name': name}).resolve()
+        # not change_cwd; the working directory is shared by the threads
+        ServiceTemplate.render_stack(writer=StackWriter(output))
+        assert current_context() is context
+    assert current_context() is not context
+    return (output / 'docker-compose.yaml').read_text()
+
+
+def test_contexts_are_isolated(tmp_path):
+    outside = Volume(name="outside")
+    assert render(tmp_path / 'a', 'a') == "volumes:\n  a: null\n"
+    assert render(tmp_path / 'b', 'b') == "volumes:\n  b: null\n"
+    assert outside in current_context().service_templates.values()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        names = [f'stack{i}' for i in range(8)]
+        outputs = list(executor.map(lambda name: render(tmp_path / name, name), names))
+    assert outputs == [f"volumes:\n  {name}: null\n" for name in names]
+
+
+def test_nested_contexts():
+    outer = StackContext()
+    inner = StackContext()
+    with outer:
+        key = configuration_parameter("nested", "key")
+        with inner:
+            assert configuration_parameter("nested", "key") is not key
+        assert current_context() is outer
+        assert configuration_parameter("nested", "key") is key
@@ -0,0 +1,71 @@
+import stat
+import threading
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from vendorless.core import daemon
+from vendorless.core.cli import main
+from vendorless.core.commands import serve_request
+
+BLUEPRINT = """
+import warnings
+
+from vendorless.core import Volume
+from vendorless.core.parameters import configuration_parameter
+
+name = configuration_parameter("volume", "name")
+volume = Volume()
+volume.name = name
+warnings.warn("a warning from the blueprint")
+"""
+
+
+def test_render_daemon(tmp_path, monkeypatch):
+    socket_path = tmp_path / 'render.sock'
+    monkeypatch.setenv(daemon.SOCKET_ENV, str(socket_path))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'blueprint.py').write_text(BLUEPRINT)
+
+    assert not daemon.is_running()
+    # a daemon thread, so a server that doesn't stop can't keep the test session running
+    server = threading.Thread(target=daemon.serve, args=(serve_request,), daemon=True)
+    server.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not daemon.is_running():
+            if not server.is_alive() or time.monotonic() > deadline:
+                pytest.fail("the render daemon didn't start")
+            time.sleep(0.01)
+        assert stat.S_IMODE(socket_path.stat().st_mode) == 0o600
+
+        for name in ['first', 'second']:
+            monkeypatch.setenv('VENDORLESS_CONFIG__volume__name', name)
+            result = CliRunner().invoke(main, ['core', 'render', 'blueprint.py', '-o', name, '-y', '--daemon'])
+            assert result.exit_code == 0, result.output
+            assert 'Stack files: 2 written' in result.output
+            assert 'UserWarning: a warning from the blueprint' in result.stderr
+            assert (tmp_path / name / 'docker-compose.yaml').read_text() == f"volumes:\n  {name}: null\n"
+
+        # the daemon is only used when it's asked for
+        with pytest.warns(UserWarning, match='a warning from the blueprint'):
+            result = CliRunner().invoke(main, ['core', 'render', 'blueprint.py', '-o', 'local', '-y'])
+        assert result.exit_code == 0, result.output
+        assert (tmp_path / 'local' / 'docker-compose.yaml').read_text() == "volumes:\n  second: null\n"
+
+        # settings can't be prompted for
+        monkeypatch.delenv('VENDORLESS_CONFIG__volume__name')
+        result = CliRunner().invoke(main, ['core', 'render', 'blueprint.py', '-o', 'third', '-y', '--daemon'])
+        assert result.exit_code == 1
+        assert "'volume.name' isn't configured" in result.output
+    finally:
+        if daemon.is_running():
+            daemon.request({'command': 'shutdown'})
+        server.join(timeout=5)
+    assert not server.is_alive()
+    assert not socket_path.exists()
+
+    result = CliRunner().invoke(main, ['core', 'render', 'blueprint.py', '-y', '--daemon'])
+    assert result.exit_code == 1
+    assert "isn't running" in result.output
@@ -0,0 +1,183 @@
+import io
+import os
+import tarfile
+
+import pytest
+
+from vendorless.core import output
+from vendorless.core.output import StackWriter, TarWriter
+
+
+def test_stack_writer_skips_unchanged_files(tmp_path):
+    writer = StackWriter(tmp_path)
+    writer.write('a.txt', 'a')
+    writer.write('sub/b.txt', 'b')
+    assert writer.written == ['a.txt', 'sub/b.txt']
+    assert (tmp_path / 'sub' / 'b.txt').read_text() == 'b'
+    mtime = (tmp_path / 'a.txt').stat().st_mtime_ns
+
+    writer = StackWriter(tmp_path, writer.hashes)
+    writer.write('a.txt', 'a')
+    writer.write('sub/b.txt', 'changed')
+    assert writer.unchanged == ['a.txt']
+    assert writer.written == ['sub/b.txt']
+    assert (tmp_path / 'a.txt').stat().st_mtime_ns == mtime
+    assert (tmp_path / 'sub' / 'b.txt').read_text() == 'changed'
+    assert sorted(p.name for p in (tmp_path / 'sub').iterdir()) == ['b.txt']  # no temp files
+
+
+def test_stack_writer_detects_edits_and_leftovers(tmp_path):
+    writer = StackWriter(tmp_path)
+    writer.write('a.txt', 'a')
+    writer.write('b.txt', 'b')
+
+    (tmp_path / 'a.txt').write_text('edited')
+    writer = StackWriter(tmp_path, writer.hashes)
+    writer.write('a.txt', 'a')
+    assert writer.written == ['a.txt']
+    assert (tmp_path / 'a.txt').read_text() == 'a'
+
+    assert writer.leftovers() == ['b.txt']
+    writer.remove(writer.leftovers())
+    assert not (tmp_path / 'b.txt').exists()
+    assert writer.summary() == "1 written, 0 unchanged, 1 removed"
+
+
+def test_stack_writer_keeps_modes(tmp_path):
+    writer = StackWriter(tmp_path)
+    writer.write('run.sh', 'echo a')
+    with writer.open('secret.yaml') as f:
+        f.write('a: 1\n')
+    (tmp_path / 'run.sh').chmod(0o755)
+    (tmp_path / 'secret.yaml').chmod(0o600)
+
+    writer = StackWriter(tmp_path, writer.hashes)
+    writer.write('run.sh', 'echo b')
+    with writer.open('secret.yaml') as f:
+        f.write('a: 2\n')
+    assert writer.written == ['run.sh', 'secret.yaml']
+    assert (tmp_path / 'run.sh').stat().st_mode & 0o777 == 0o755
+    assert (tmp_path / 'secret.yaml').stat().st_mode & 0o777 == 0o600
+
+
+def test_stack_writer_leftovers_without_hashes(tmp_path):
+    # a stack whose lock file doesn't record the files' hashes
+    (tmp_path / 'sub').mkdir()
+    for name in ['a.txt', 'old.txt', 'vendorless-lock.yaml', 'sub/old.txt']:
+        (tmp_path / name).write_text('old')
+
+    writer = StackWriter(tmp_path)
+    writer.write('a.txt', 'a')
+    writer.write('vendorless-lock.yaml', 'lock', record=False)
+    assert writer.leftovers() == ['old.txt']
+
+
+def test_stack_writer_hashes_destinations(tmp_path):
+    writer = StackWriter(tmp_path)
+    writer.write('a.txt', 'a' * 10)
+    writer = StackWriter(tmp_path, writer.hashes)
+    writer.write('a.txt', 'a' * 10)
+    assert writer.unchanged == ['a.txt']
+
+    # an edit that keeps the file's size and mtime
+    st = (tmp_path / 'a.txt').stat()
+    (tmp_path / 'a.txt').write_text('b' * 10)
+    os.utime(tmp_path / 'a.txt', ns=(st.st_atime_ns, st.st_mtime_ns))
+    writer = StackWriter(tmp_path, writer.hashes)
+    writer.write('a.txt', 'a' * 10)
+    assert writer.written == ['a.txt']
+    assert (tmp_path / 'a.txt').read_text() == 'a' * 10
+
+
+def test_stack_writer_open(tmp_path):
+    writer = StackWriter(tmp_path)
+    with writer.open('a.yaml') as f:
+        f.write('a: 1\n')
+    assert (tmp_path / 'a.yaml').read_text() == 'a: 1\n'
+
+    writer = StackWriter(tmp_path, writer.hashes)
+    with writer.open('a.yaml') as f:
+        f.write('a: 1\n')
+    assert writer.unchanged == ['a.yaml']
+    assert [p.name for p in tmp_path.iterdir()] == ['a.yaml']
+
+
+def test_tar_writer(tmp_path):
+    asset = tmp_path / 'asset.bin'
+    asset.write_bytes(bytes(range(256)) * 1000)
+
+    stream = io.BytesIO()
+    with TarWriter(stream, 'gz') as archive:
+        archive.write('a.txt', 'a')
+        archive.write('assets/asset.bin', asset)
+        with archive.open('docker-compose.yaml') as f:
+            f.write('services: {}\n')
+        archive.write('lock.yaml', 'lock', record=False)
+    assert archive.leftovers() == []
+
+    directory = StackWriter(tmp_path / 'stack')
+    directory.write('a.txt', 'a')
+    directory.write('assets/asset.bin', asset)
+    with directory.open('docker-compose.yaml') as f:
+        f.write('services: {}\n')
+    assert archive.hashes == directory.hashes
+
+    with tarfile.open(fileobj=io.BytesIO(stream.getvalue()), mode='r:gz') as tar:
+        assert tar.getnames() == ['a.txt', 'assets/asset.bin', 'docker-compose.yaml', 'lock.yaml']
+        assert tar.extractfile('assets/asset.bin').read() == asset.read_bytes()
+        assert tar.extractfile('docker-compose.yaml').read() == b'services: {}\n'
+
+
+def test_tar_writer_streams_resources(tmp_path):
+    import hashlib
+    import zipfile
+
+    # a resource in a zipped package
+    data = bytes(range(256)) * 10000
+    with zipfile.ZipFile(tmp_path / 'package.zip', 'w') as z:
+        z.writestr('templates/asset.bin', data)
+    resource = zipfile.Path(tmp_path / 'package.zip') / 'templates' / 'asset.bin'
+
+    stream = io.BytesIO()
+    with TarWriter(stream) as archive:
+        archive.write('asset.bin', resource)
+    assert archive.hashes == {'asset.bin': hashlib.sha256(data).hexdigest()}
+    with tarfile.open(fileobj=io.BytesIO(stream.getvalue()), mode='r:') as tar:
+        assert tar.extractfile('asset.bin').read() == data
+
+
+def test_tar_writer_abort():
+    stream = io.BytesIO()
+    with pytest.raises(RuntimeError):
+        with TarWriter(stream) as archive:
+            archive.write('a.txt', 'a' * 100000)
+            raise RuntimeError
+    with tarfile.open(fileobj=io.BytesIO(stream.getvalue()), mode='r:') as tar:
+        with pytest.raises(tarfile.ReadError):
+            tar.getmembers()
+
+
+def test_stack_writer_copies_shared_assets(tmp_path, monkeypatch):
+    asset = tmp_path / 'seed.sql'
+    asset.write_bytes(b'insert into t values (1);\n' * 100000)
+
+    hashed = []
+    hash_file = output.hash_file
+    monkeypatch.setattr(output, 'hash_file', lambda path: hashed.append(path) or hash_file(path))
+    copied = []
+    copy_file = output._copy_file
+    monkeypatch.setattr(output, '_copy_file', lambda src, dst: copied.append(src) or copy_file(src, dst))
+    writer = StackWriter(tmp_path / 'stack')
+    for i in range(3):
+        writer.write(f'db{i}/seed.sql', asset)
+    assert writer.written == ['db0/seed.sql', 'db1/seed.sql', 'db2/seed.sql']
+    assert hashed == [asset]  # the asset is only read once to hash it
+    # later copies are made from the first one in the stack
+    first = tmp_path / 'stack' / 'db0' / 'seed.sql'
+    assert copied == [asset, first, first]
+    for i in range(3):
+        assert (tmp_path / 'stack' / f'db{i}' / 'seed.sql').read_bytes() == asset.read_bytes()
+
+    writer = StackWriter(tmp_path / 'stack', writer.hashes)
+    writer.write('db0/seed.sql', asset)
+    assert writer.unchanged == ['db0/seed.sql']
@@ -2,6 +2,7 @@
 # from vendorless.core.core import parameter
 from vendorless.core import computed_parameter, parameter, ServiceTemplate, ConfigurationParameter
 from vendorless.core.testing import stage_cli_prompt_responses
+from vendorless.core.parameters import ParameterReference
 from typing import Any
 import attr
 import attrs
@@ -104,4 +105,136 @@ def test_configuration_parameter_3(monkeypatch):
         "param2": "world",
     }
     response = ConfigurationParameter.resolve({})
-    assert settings == response
\ No newline at end of file
+    assert settings == response
+
+def test_configuration_parameter_registry():
+    from vendorless.core.context import current_context
+    from vendorless.core.parameters import configuration_parameter
+
+    params = [configuration_parameter("registry", f"param{i}") for i in range(1000)]
+    assert configuration_parameter("registry", "param10") is params[10]
+    registered = [
+        c for c in current_context().configuration_parameters.values()
+        if c.keys[0] == "registry"
+    ]
+    assert registered == params
+
+    del params, registered
+    assert not any(
+        c.keys[0] == "registry" for c in current_context().configuration_parameters.values()
+    )
+    assert ("registry", "param10") not in current_context().configuration_parameters_by_keys
+
+
+@dataclass
+class Chain(ServiceTemplate):
+    host: str = parameter()
+
+    @computed_parameter
+    def url(self, host):
+        return f"http://{host}"
+
+    @computed_parameter
+    def health_url(self, url):
+        return f"{url}/health"
+
+
+def test_computed_parameter_memoization():
+    a = Chain()
+    b = Chain()
+    b.host = a.host
+    assert isinstance(b.health_url, ParameterReference)
+
+    a.host = "db"
+    computed_parameter.reset_evaluations()
+    assert b.health_url == "http://db/health"
+    assert computed_parameter.evaluations == 2
+    assert b.health_url == "http://db/health"
+    assert b.url == "http://db"
+    assert computed_parameter.evaluations == 2
+
+    # changing a linked input invalidates the cached values
+    a.host = "cache"
+    assert b.health_url == "http://cache/health"
+    assert computed_parameter.evaluations == 4
+
+    cp = ConfigurationParameter("memoization", "host")
+    a.host = cp
+    cp.value = "queue"
+    assert b.health_url == "http://queue/health"
+
+
+def test_computed_parameter_invalidation_is_per_context():
+    from concurrent.futures import ThreadPoolExecutor
+    from vendorless.core.context import StackContext
+
+    with StackContext() as context:
+        a = Chain(host="db")
+        assert a.health_url == "http://db/health"
+    with StackContext():
+        Chain(host="other")  # assignments in another stack
+
+    computed_parameter.reset_evaluations()
+    with context:
+        assert a.health_url == "http://db/health"
+    assert computed_parameter.evaluations == 0
+
+    def evaluate(i):
+        with StackContext():
+            return Chain(host=f"host{i}").health_url
+
+    computed_parameter.reset_evaluations()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(evaluate, range(200)))
+    assert computed_parameter.evaluations == 400
+
+
+def test_resolve_parameters():
+    from vendorless.core.parameters import resolve_parameters
+
+    chain = [Chain() for _ in range(5000)]
+    for previous, current in zip(chain, chain[1:]):
+        current.host = previous.host
+    chain[0].host = "db"
+    unresolved = C()
+
+    computed_parameter.reset_evaluations()
+    resolve_parameters(chain + [unresolved])
+    assert computed_parameter.evaluations == 2 * len(chain)
+    # no dereference chain (this would exceed the recursion limit)
+    assert chain[-1].health_url == "http://db/health"
+    assert chain[-1].host == "db"
+    assert computed_parameter.evaluations == 2 * len(chain)
+    assert isinstance(unresolved.p, ParameterReference)
+    assert isinstance(unresolved.cp, ParameterReference)
+
+    chain[0].host = "cache"
+    assert chain[1].url == "http://cache"
+
+
+def test_resolve_parameters_cycle():
+    from vendorless.core.parameters import resolve_parameters, ParameterCycleError
+
+    a = C()
+    b = C()
+    b.p = a.cp
+    a.p = b.p
+    with pytest.raises(ParameterCycleError, match=r"C\[0\].p -> C\[0\].cp -> C\[0\].p"):
+        resolve_parameters([a, b])
+
+
+def test_parameter_reference_cache_not_pickled():
+    import pickle
+
+    a = C()
+    b = C()
+    b.p = a.p
+    a.p = "db"
+    assert b.p == "db"
+    reference = b._p
+    assert not hasattr(reference, '__dict__')
+    assert reference.value == "db"
+
+    unpickled = pickle.loads(pickle.dumps(reference))
+    assert unpickled == reference
+    assert unpickled.generation == -1 and unpickled.value is None
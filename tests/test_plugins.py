@@ -0,0 +1,38 @@
+import json
+
+import click
+
+from vendorless.core.plugins import LazyGroup, plugin_index
+
+
+def test_plugin_index_is_cached(monkeypatch, tmp_path):
+    monkeypatch.setenv('VENDORLESS_CACHE_DIR', str(tmp_path))
+    plugins = plugin_index()
+    assert plugins['core'] == 'vendorless.core.commands:cli'
+
+    index_file, = tmp_path.iterdir()
+    with open(index_file) as f:
+        cached = json.load(f)
+    cached['plugins']['fake'] = 'fake.module:cli'
+    with open(index_file, 'w') as f:
+        json.dump(cached, f)
+    assert plugin_index()['fake'] == 'fake.module:cli'
+
+    # invalidated when a watched path changes
+    cached['fingerprint'][0][1] -= 1
+    with open(index_file, 'w') as f:
+        json.dump(cached, f)
+    assert 'fake' not in plugin_index()
+
+
+def test_lazy_group():
+    group = LazyGroup(plugins={
+        'core': 'vendorless.core.commands:cli',
+        'missing': 'vendorless.does_not_exist.commands:cli',
+    })
+    ctx = click.Context(group)
+    assert group.list_commands(ctx) == ['core', 'missing']
+    assert 'core' not in group.commands
+    assert isinstance(group.get_command(ctx, 'core'), click.Group)
+    assert 'core' in group.commands
+    assert group.get_command(ctx, 'missing') is None
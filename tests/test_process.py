@@ -0,0 +1,69 @@
+import sys
+import time
+
+from vendorless.core.process import run
+
+
+def test_separate_streams():
+    result = run(
+        sys.executable, '-c', 'import sys; print("out"); print("err", file=sys.stderr); sys.exit(3)',
+        capture=True,
+    )
+    assert result.returncode == 3
+    assert not result.ok
+    assert result.stdout == "out\n"
+    assert result.stdout_tail == "out\n"
+    assert result.stderr_tail == "err\n"
+
+
+def test_input_and_tail():
+    result = run(
+        sys.executable, '-c', 'import sys; data = sys.stdin.read(); print(data * 10000)',
+        input="0123456789",
+    )
+    assert result.ok
+    assert result.stdout is None
+    assert result.stdout_tail.endswith("0123456789\n")
+    assert len(result.stdout_tail) < 100000
+
+
+def test_timeout_kills_process_group():
+    start = time.perf_counter()
+    # the grandchild keeps the pipes open, so this only returns if the whole group is killed
+    result = run('sh', '-c', 'sleep 30 & sleep 30', timeout=0.5)
+    assert result.timed_out
+    assert not result.ok
+    assert time.perf_counter() - start < 10
+
+
+def test_missing_executable():
+    result = run('vendorless-command-that-does-not-exist')
+    assert result.returncode == 127
+
+
+def test_echo_flushes_when_quiet(monkeypatch):
+    from vendorless.core import process
+
+    printed = []
+    monkeypatch.setattr(process.console, 'print', lambda text, **kwargs: printed.append((time.perf_counter(), text)))
+    start = time.perf_counter()
+    # the second line arrives within FLUSH_INTERVAL of the first, then the command goes quiet
+    result = run(sys.executable, '-c', 'import time; print("a", flush=True); print("b", flush=True); time.sleep(1)', echo=True)
+    assert result.ok
+    assert ''.join(text for _, text in printed) == "a\nb\n"
+    assert printed[-1][0] - start < 0.9
+
+
+def test_timeout_covers_process_exit():
+    start = time.perf_counter()
+    # the pipes are closed long before the process exits
+    result = run('sh', '-c', 'exec >/dev/null 2>&1; sleep 30', timeout=0.5)
+    assert result.timed_out
+    assert time.perf_counter() - start < 10
+
+
+def test_foreground():
+    result = run(sys.executable, '-c', 'import os, sys; sys.exit(0 if os.getsid(0) == os.getsid(os.getppid()) else 1)', foreground=True)
+    assert result.ok
+    result = run('sleep', '30', foreground=True, timeout=0.5)
+    assert result.timed_out
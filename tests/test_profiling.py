@@ -0,0 +1,28 @@
+import json
+
+from vendorless.core import profiling
+
+
+def test_profiler(tmp_path):
+    with profiling.span('disabled', 'phase'):
+        pass
+
+    profiler = profiling.enable()
+    try:
+        with profiling.span('render templates', 'phase'):
+            for name in ['a.txt', 'b.txt', 'a.txt']:
+                with profiling.span(name, 'template file', package='vendorless.core'):
+                    sum(range(10000))
+    finally:
+        assert profiling.disable() is profiler
+
+    assert [(s.name, s.category) for s in profiler.spans] == [
+        ('a.txt', 'template file'), ('b.txt', 'template file'), ('a.txt', 'template file'), ('render templates', 'phase'),
+    ]
+    assert all(s.wall >= 0 and s.cpu >= 0 for s in profiler.spans)
+
+    trace = tmp_path / 'trace.json'
+    profiler.write_chrome_trace(trace)
+    events = json.loads(trace.read_text())['traceEvents']
+    assert len(events) == 4
+    assert events[0]['ph'] == 'X' and events[0]['args']['package'] == 'vendorless.core'
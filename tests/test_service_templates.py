@@ -22,8 +22,51 @@ def test_template_files():
 
     x = _DummyServiceTemplates()
     yielded_templates = set(src_dest_pair for src_dest_pair in x._template_list())
-    assert ('volume/docker-compose.yaml', 'volume/docker-compose.yaml') in yielded_templates
-    assert ('package/cookiecutter.json', 'package/cookiecutter.json') in yielded_templates
+    # the package cookiecutter template isn't part of a stack
+    assert ('package/cookiecutter.json', 'package/cookiecutter.json') not in yielded_templates
+    assert not any(src.startswith('package/') for src, _ in yielded_templates)
+
+
+def test_template_files_skip_cookiecutter_templates(tmp_path, monkeypatch):
+    package = tmp_path / 'vendorless' / 'cookiecutterdemo'
+    for path in ['templates/app/docker-compose.yaml', 'templates/config.yaml',
+                 'templates/scaffold/cookiecutter.json', 'templates/scaffold/{{cookiecutter.name}}/README.md']:
+        (package / path).parent.mkdir(parents=True, exist_ok=True)
+        (package / path).write_text('')
+    (package / '__init__.py').write_text('')
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    @dataclass
+    class X(ServiceTemplate):
+        pass
+
+    X.__module__ = 'vendorless.cookiecutterdemo'
+    assert X()._template_list() == [('app/docker-compose.yaml', 'app/docker-compose.yaml'), ('config.yaml', 'config.yaml')]
+
+
+def test_template_manifest():
+    from vendorless.core.service_template import template_manifest
+
+    template_manifest.cache_clear()
+    manifest = template_manifest('vendorless.core')
+    assert 'package/cookiecutter.json' in manifest
+    assert template_manifest('vendorless.core') is manifest
+    assert template_manifest.cache_info().misses == 1
+
+
+def test_template_dir():
+    from vendorless.core.service_template import template_manifest
+
+    @dataclass
+    class X(ServiceTemplate):
+        template_dir = 'package'
+
+    X.__module__ = 'vendorless.core.x'
+    # only its own directory, relative to the stack's root
+    assert X()._template_list() == [
+        (f, f.removeprefix('package/')) for f in template_manifest('vendorless.core') if f.startswith('package/')
+    ]
+    assert ('package/cookiecutter.json', 'cookiecutter.json') in X()._template_list()
 
 
 # def test_render_postgres():
@@ -39,4 +82,67 @@ def test_template_files():
 #     v.name = "pgdata_volume"
 
 #     root = Path('.build/')
-#     ServiceTemplate.render_stack(root)
\ No newline at end of file
+#     ServiceTemplate.render_stack(root)
+
+def test_shared_environment():
+    from vendorless.core.templating import get_environment, render_path
+
+    env = get_environment('vendorless.core')
+    assert get_environment('vendorless.core') is env
+
+    template = env.get_template('package/cookiecutter.json')
+    assert env.get_template('package/cookiecutter.json') is template
+
+    assert render_path('vendorless.core', '{{ name }}/file.txt', {'name': 'a'}) == 'a/file.txt'
+    assert render_path('vendorless.core', '{{ name }}/file.txt', {'name': 'b'}) == 'b/file.txt'
+
+
+def test_parallel_render_stack(tmp_path):
+    import gc
+    from vendorless.core import Volume
+    from vendorless.core.utils import change_cwd
+
+    gc.collect()  # drop service templates left over from other tests
+    volumes = [Volume(name=f"volume-{i}") for i in range(50)]
+
+    with change_cwd(tmp_path):
+        ServiceTemplate.render_stack()
+        serial = (tmp_path / 'docker-compose.yaml').read_bytes()
+        ServiceTemplate.render_stack(workers=8)
+        parallel = (tmp_path / 'docker-compose.yaml').read_bytes()
+    assert serial == parallel
+
+    volumes.append(Volume(name="volume-0"))
+    with change_cwd(tmp_path), pytest.raises(ValueError, match="multiple service templates render volumes.volume-0"):
+        ServiceTemplate.render_stack(workers=8)
+
+
+def test_docker_compose_hook(tmp_path):
+    import gc
+    from vendorless.core import yamlio
+    from vendorless.core.utils import change_cwd
+    from vendorless.core.parameters import parameter
+
+    @dataclass
+    class Service(ServiceTemplate):
+        name: str = parameter()
+
+        def _template_list(self):
+            return []
+
+        def _docker_compose(self):
+            return {'services': {self.name: {'image': 'nginx'}}}
+
+    gc.collect()  # drop service templates left over from other tests
+    a = Service(name="a")
+    b = Service(name="b")
+    with change_cwd(tmp_path):
+        ServiceTemplate.render_stack()
+    with open(tmp_path / 'docker-compose.yaml') as f:
+        assert yamlio.load(f) == {'services': {'a': {'image': 'nginx'}, 'b': {'image': 'nginx'}}}
+
+    # a class defined in a function can't be pickled, so workers render it in this process
+    with change_cwd(tmp_path):
+        ServiceTemplate.render_stack(workers=2)
+    with open(tmp_path / 'docker-compose.yaml') as f:
+        assert yamlio.load(f) == {'services': {'a': {'image': 'nginx'}, 'b': {'image': 'nginx'}}}
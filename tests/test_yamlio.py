@@ -0,0 +1,28 @@
+import yaml
+
+from vendorless.core import yamlio
+
+
+DATA = {
+    'services': {
+        f'service-{i}': {
+            'image': 'postgres:17',
+            'environment': {'PASSWORD': 'p@ss: word', 'GREETING': 'héllo wörld'},
+            'command': ['sh', '-c', 'echo "multi\nline"'],
+            'ports': [f'{5432 + i}:5432'],
+            'healthcheck': {'interval': '10s', 'retries': 3, 'disable': False},
+            'empty': None,
+        }
+        for i in range(20)
+    },
+    'volumes': {'data': None},
+}
+
+
+def test_dump_matches_pure_python():
+    assert yamlio.dump(DATA) == yaml.dump(DATA, Dumper=yaml.SafeDumper)
+
+
+def test_round_trip():
+    assert yamlio.load(yamlio.dump(DATA)) == DATA
+    assert yamlio.load(yaml.safe_dump(DATA)) == yaml.safe_load(yaml.safe_dump(DATA))